@@ -0,0 +1,67 @@
+"""
+Benchmark of storage of pending notifications. Usage:
+
+    python bench.py [-n 1000000] [-r 3]
+
+Times a snapshot of n pending notifications, and recovery from it
+with a journal that is one event short of compaction, as after
+the app stopped right before compacting. Does not need wx
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from journal import JOURNAL_COMPACT_EVENTS, NotificationJournal
+
+BENCH_PENDING = 1000000
+BENCH_REPEAT = 3
+
+
+def measure(action, repeat):
+    """
+    @return: the best time of action in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_journal(count, repeat):
+    directory = tempfile.mkdtemp()
+    try:
+        journal = NotificationJournal(directory)
+        journal.load()
+        pending = [(1e9 + number, number, f"notification {number}") for number in range(count)]
+        results = { "snapshot": measure(lambda: journal.compact(pending, count), repeat) }
+        # half of the journal delivers the earliest ones, the other half adds new ones
+        delivered = JOURNAL_COMPACT_EVENTS // 2
+        journal.deliver(list(range(delivered)))
+        journal.add([(2e9 + number, number, f"notification {number}")
+            for number in range(count, count + JOURNAL_COMPACT_EVENTS - delivered - 1)])
+        journal.file.close()
+        def recover():
+            recovered = NotificationJournal(directory)
+            recovered.load()
+            recovered.file.close()
+        results["recover"] = measure(recover, repeat)
+        return results
+    finally:
+        shutil.rmtree(directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of storage of pending notifications")
+    parser.add_argument("-n", "--pending", type=int, default=BENCH_PENDING, help="count of pending notifications")
+    parser.add_argument("-r", "--repeat", type=int, default=BENCH_REPEAT, help="count of runs, the best is reported")
+    args = parser.parse_args(argv)
+    for name, seconds in bench_journal(args.pending, args.repeat).items():
+        print(f"{name:10} {seconds * 1000:10.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Storage of pending notifications on disk for the iw app: a snapshot of
+the heap and a journal of changes after it. Does not depend on wx
+"""
+import heapq
+import json
+import os
+import struct
+from array import array
+
+JOURNAL_DIRECTORY = os.path.join(os.path.expanduser("~"), ".iw-notifications")
+JOURNAL_COMPACT_EVENTS = 10000 # added and delivered notifications, so that replay stays fast
+SNAPSHOT_MAGIC = b"IWN1"
+SNAPSHOT_HEADER = struct.Struct("=4sqqq") # magic, next number, count, size of messages
+
+
+def write_snapshot(path, pending, number):
+    """
+    Write heap of pending notifications as plain arrays: timestamps,
+    numbers and NUL separated UTF-8 messages, in the order of the heap
+    """
+    times = array("d", [item[0] for item in pending])
+    numbers = array("q", [item[1] for item in pending])
+    text = "\0".join([item[2] for item in pending]).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, number, len(pending), len(text)))
+        f.write(times.tobytes())
+        f.write(numbers.tobytes())
+        f.write(text)
+
+
+def read_snapshot(path):
+    """
+    @return: (heap of pending (time, number, message), next number)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, number, count, size = SNAPSHOT_HEADER.unpack_from(data)
+    offset = SNAPSHOT_HEADER.size
+    if magic != SNAPSHOT_MAGIC or len(data) != offset + 16 * count + size:
+        raise ValueError(f"{path} is not a snapshot of notifications")
+    times = array("d", data[offset:offset + 8 * count])
+    numbers = array("q", data[offset + 8 * count:offset + 16 * count])
+    messages = data[offset + 16 * count:].decode("utf-8").split("\0") if count else []
+    return list(zip(times, numbers, messages)), number
+
+
+class NotificationJournal:
+    """
+    Keeps pending notifications on disk. Every added and delivered
+    notification is appended to the journal as a JSON line, and
+    when the journal grows, all pending ones are written to a snapshot
+    and the journal starts over
+    """
+    def __init__(self, directory=JOURNAL_DIRECTORY):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, "snapshot.bin")
+        self.journal_path = os.path.join(directory, "journal.jsonl")
+        self.events = 0
+        self.file = None
+
+    def load(self):
+        """
+        Read snapshot and replay journal after it
+        @return: (heap of pending (time, number, message), next number)
+        """
+        pending, number = [], 0
+        if os.path.exists(self.snapshot_path):
+            pending, number = read_snapshot(self.snapshot_path)
+        added, delivered = [], set()
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                end = 0
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    end += len(line)
+                    # adds may already be in snapshot if the app stopped while compacting
+                    if event[0] == "add":
+                        self.events += 1
+                        if event[2] >= number:
+                            added.append(tuple(event[1:]))
+                    elif event[0] == "deliver":
+                        self.events += len(event[1])
+                        delivered.update(event[1])
+                # the last line is cut if the app stopped while writing it
+                f.truncate(end)
+        if added or delivered:
+            for item in added:
+                heapq.heappush(pending, item)
+            # notifications are delivered in order of time, so delivered ones are on top of the heap
+            removed = 0
+            while pending and pending[0][1] in delivered:
+                heapq.heappop(pending)
+                removed += 1
+            if removed < len(delivered):
+                pending = [item for item in pending if item[1] not in delivered]
+                heapq.heapify(pending)
+            number = max([number] + [item[1] + 1 for item in added])
+        self.file = open(self.journal_path, "a", encoding="utf-8")
+        return pending, number
+
+    def add(self, items):
+        self.write([["add", *item] for item in items], len(items))
+
+    def deliver(self, numbers):
+        self.write([["deliver", numbers]], len(numbers))
+
+    def write(self, events, count):
+        """
+        @param count: count of notifications added or delivered by events
+        """
+        self.file.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+        self.file.flush()
+        self.events += count
+
+    def needs_compaction(self):
+        return self.events >= JOURNAL_COMPACT_EVENTS
+
+    def compact(self, pending, number):
+        """
+        Write all pending notifications to snapshot and clear journal
+        """
+        temporary = self.snapshot_path + ".tmp"
+        write_snapshot(temporary, pending, number)
+        os.replace(temporary, self.snapshot_path)
+        self.file.close()
+        self.file = open(self.journal_path, "w", encoding="utf-8")
+        self.events = 0
+
+    def close(self, pending, number):
+        self.compact(pending, number)
+        self.file.close()
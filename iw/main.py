@@ -1,6 +1,12 @@
 import wx
 import wx.adv
 import datetime as dt
+import csv
+import heapq
+import json
+import math
+import time as clock
+from journal import JOURNAL_COMPACT_EVENTS, NotificationJournal
 
 class SinglePanelWindow(wx.Frame):
     def __init__(self, parent, title=""):
@@ -22,11 +28,107 @@ MODE_INDICATOR_TEXT = {
     FIXEDTIME: "Fixed time (hh:mm:ss)" 
 }
 
+OUTPUT_CAPACITY = 10000 # lines, older ones are dropped
+TIMER_MAX_DELAY = 2 ** 31 - 1 # ms, about 24.8 days, wx.Timer takes a C int
+
+
+class RingBuffer:
+    """
+    List of fixed capacity, appending to a full one drops the oldest item
+    """
+    def __init__(self, capacity):
+        self.items = [None] * capacity
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError("ring buffer index out of range")
+        return self.items[(self.start + index) % len(self.items)]
+
+    def extend(self, values):
+        capacity = len(self.items)
+        for value in values[-capacity:]:
+            if self.count < capacity:
+                self.items[(self.start + self.count) % capacity] = value
+                self.count += 1
+            else:
+                self.items[self.start] = value
+                self.start = (self.start + 1) % capacity
+
+
+class NotificationLog(wx.ListCtrl):
+    """
+    Virtual list of delivered notifications, keeps only the latest ones
+    """
+    def __init__(self, parent, capacity=OUTPUT_CAPACITY):
+        wx.ListCtrl.__init__(self, parent, -1, style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_NO_HEADER)
+        self.InsertColumn(0, "")
+        self.lines = RingBuffer(capacity)
+        self.Bind(wx.EVT_SIZE, self.OnSize)
+
+    def append_lines(self, lines):
+        self.lines.extend(lines)
+        self.SetItemCount(len(self.lines))
+        self.EnsureVisible(len(self.lines) - 1)
+        self.Refresh()
+
+    def OnSize(self, event):
+        self.SetColumnWidth(0, self.GetClientSize()[0])
+        event.Skip()
+
+    def OnGetItemText(self, item, column):
+        return self.lines[item]
+
+
+def parse_notification_time(text, now):
+    """
+    Read time of a notification: "hh:mm:ss" is fixed time of today,
+    "+hh:mm:ss" is timeout from now, anything else is an ISO date and time
+    @return: timestamp
+    """
+    text = text.strip()
+    if text.startswith("+"):
+        hours, minutes, seconds = map(int, text[1:].split(":"))
+        return (now + dt.timedelta(hours=hours, minutes=minutes, seconds=seconds)).timestamp()
+    if len(text) <= 8:
+        return dt.datetime.combine(now, dt.time.fromisoformat(text)).timestamp()
+    return dt.datetime.fromisoformat(text).timestamp()
+
+
+def read_notifications(path):
+    """
+    Read notifications from CSV file with time and message columns
+    and an optional header row, or from JSON list of objects
+    with "time" and "message" keys
+    @return: list of (timestamp, message)
+    """
+    now = dt.datetime.now()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".json"):
+            rows = [(item["time"], item["message"]) for item in json.loads(f.read())]
+        else:
+            rows = [row for row in csv.reader(f) if row]
+            # a header row like "time,message" is skipped
+            if rows:
+                try:
+                    parse_notification_time(rows[0][0], now)
+                except ValueError:
+                    rows = rows[1:]
+    return [(parse_notification_time(time, now), message) for time, message in rows]
+
+
 class NotificationsView(wx.Panel):
-    def __init__(self, parent):
+    def __init__(self, parent, journal=None):
         wx.Panel.__init__(self, parent)
-        self.pending = []
-        self.ready = []
+        self.journal = journal
+        self.pending = [] # heap of (timestamp, number, message), number keeps insertion order
+        self.number = 0
+        if journal is not None:
+            self.pending, self.number = journal.load()
         self.mode = TIMEOUT
         sizer = wx.GridBagSizer(8, 2)
         rows, cols = 5, 5
@@ -55,7 +157,10 @@ class NotificationsView(wx.Panel):
         # Output
         text = wx.StaticText(self, -1, "Notifications")
         sizer.Add(text, wx.GBPosition(3, 0), wx.GBSpan(1, 3), flag=wx.TOP | wx.LEFT | wx.EXPAND, border=6)
-        output = wx.TextCtrl(self, -1, style=wx.TE_MULTILINE|wx.TE_READONLY)
+        import_button = wx.Button(self, -1, "Import...")
+        import_button.Bind(wx.EVT_BUTTON, lambda _: self.on_import())
+        sizer.Add(import_button, wx.GBPosition(3, 3), wx.GBSpan(1, 2), flag=wx.EXPAND)
+        output = NotificationLog(self)
         output.SetFont(wx.Font(11, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
         sizer.Add(output, wx.GBPosition(4, 0), wx.GBSpan(1, 5), flag=wx.EXPAND)
         # Remember widgets
@@ -63,11 +168,13 @@ class NotificationsView(wx.Panel):
         self.time_input = time_input
         self.text_input = text_input
         self.submit_button = submit_button
+        self.import_button = import_button
         self.output = output
-        # Timer
+        # Timer, armed once for the earliest pending notification
         self.timer = wx.Timer()
-        self.timer.Bind(wx.EVT_TIMER, lambda _: self.every_second())
-        self.timer.Start(500)
+        self.timer.Bind(wx.EVT_TIMER, lambda _: self.deliver_ready())
+        # notifications that became due while the app was closed are delivered at once
+        self.arm_timer()
         # Layout
         self.SetSizer(sizer)
         self.SetMinSize((480, 560))
@@ -88,34 +195,93 @@ class NotificationsView(wx.Panel):
         time_input_val = self.time_input.GetTime() 
         if self.mode == TIMEOUT:
             time = dt.datetime.now() + dt.timedelta(hours=time_input_val[0], 
-                minutes=time_input_val[1], seconds=time_input_val[2]) - dt.timedelta(seconds=1)
+                minutes=time_input_val[1], seconds=time_input_val[2])
         else:
             time = dt.datetime.combine(dt.datetime.now(), 
                 dt.time(time_input_val[0], time_input_val[1], time_input_val[2]))
         message = self.text_input.GetValue()
         self.text_input.SetValue("")
-        self.pending.append((time, message))
+        self.add_notifications([(time.timestamp(), message)])
         pass
 
-    def every_second(self):
-        now = dt.datetime.now()
-        def is_ready(item):
-            time, message = item
-            return now >= time
-        for time, message in filter(is_ready, self.pending):
-            # self.output.AppendText(f"─ [{time.hour:02}:{time.minute:02}:{time.second:02}] ────────────────────────────────\n{message}\n\n")
-            self.output.AppendText(f"[{time.hour:02}:{time.minute:02}:{time.second:02}] {message}\n\n")
-        self.pending = [item for item in filter(lambda i: not is_ready(i), self.pending)]
+    def add_notifications(self, items):
+        """
+        @param items: list of (timestamp, message)
+        """
+        # NUL separates messages in snapshots, and it is never shown anyway
+        entries = [(timestamp, self.number + i, message.replace("\0", "")) for i, (timestamp, message) in enumerate(items)]
+        self.number += len(entries)
+        earliest = self.pending[0] if self.pending else None
+        if len(entries) == 1:
+            heapq.heappush(self.pending, entries[0])
+        else:
+            self.pending.extend(entries)
+            heapq.heapify(self.pending)
+        if self.journal is not None:
+            if len(entries) >= JOURNAL_COMPACT_EVENTS:
+                # a large batch is written to snapshot at once instead of the journal
+                self.journal.compact(self.pending, self.number)
+            else:
+                self.journal.add(entries)
+                self.compact_journal()
+        # the timer waits for the earliest notification, which may be a new one now
+        if self.pending and self.pending[0] is not earliest:
+            self.arm_timer()
+
+    def on_import(self):
+        dialog = wx.FileDialog(self, "Import notifications", wildcard="CSV or JSON (*.csv;*.json)|*.csv;*.json",
+            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST)
+        if dialog.ShowModal() != wx.ID_OK:
+            return
+        path = dialog.GetPath()
+        try:
+            items = read_notifications(path)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            wx.MessageBox(f"Could not import {path}: {error}", "Import", wx.OK | wx.ICON_ERROR)
+            return
+        self.add_notifications(items)
+
+    def compact_journal(self):
+        if self.journal.needs_compaction():
+            self.journal.compact(self.pending, self.number)
+
+    def arm_timer(self):
+        if not self.pending:
+            self.timer.Stop()
+            return
+        delay = self.pending[0][0] - clock.time()
+        # notifications further away wait in steps, deliver_ready arms the timer again
+        self.timer.StartOnce(min(max(0, math.ceil(delay * 1000)), TIMER_MAX_DELAY))
+
+    def deliver_ready(self):
+        now = clock.time()
+        delivered = []
+        lines = []
+        while self.pending and self.pending[0][0] <= now:
+            timestamp, number, message = heapq.heappop(self.pending)
+            delivered.append(number)
+            time = dt.datetime.fromtimestamp(timestamp)
+            lines.append(f"[{time.hour:02}:{time.minute:02}:{time.second:02}] {message}")
+        # everything that is due is shown in one update
+        if lines:
+            self.output.append_lines(lines)
+        if self.journal is not None and delivered:
+            self.journal.deliver(delivered)
+            self.compact_journal()
+        # timers may fire a little early, then it is armed again for the rest
+        self.arm_timer()
 
 
 def main():
     def on_exit(event, nv):
         nv.timer.Stop()
+        journal.close(nv.pending, nv.number)
         event.Skip()
 
     app = wx.App()
+    journal = NotificationJournal()
     frame = SinglePanelWindow(None, "Timed notifications")
-    nv = NotificationsView(frame)
+    nv = NotificationsView(frame, journal)
     frame.SetContent(nv)
     frame.Bind(wx.EVT_CLOSE, lambda event: on_exit(event, nv))
     frame.Show()
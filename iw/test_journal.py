@@ -0,0 +1,113 @@
+"""
+Checks of storage of pending notifications. Run from iw directory:
+
+    python -m pytest test_journal.py
+"""
+import heapq
+import os
+import shutil
+import tempfile
+import unittest
+from journal import NotificationJournal, read_snapshot, write_snapshot
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.root = tempfile.mkdtemp()
+        self.journals = []
+
+    def tearDown(self):
+        for journal in self.journals:
+            if journal.file is not None:
+                journal.file.close()
+        shutil.rmtree(self.root)
+
+    def open(self):
+        journal = NotificationJournal(self.directory)
+        self.journals.append(journal)
+        return journal, *journal.load()
+
+    def items(self, first, count):
+        return [(1000.0 + number, number, f"повідомлення {number}") for number in range(first, first + count)]
+
+    def test_snapshot(self):
+        path = os.path.join(self.directory, "snapshot.bin")
+        pending = self.items(0, 5) + [(2000.0, 5, ""), (3000.0, 6, "a,b\nc")]
+        heapq.heapify(pending)
+        write_snapshot(path, pending, 7)
+        self.assertEqual(read_snapshot(path), (pending, 7))
+        write_snapshot(path, [], 3)
+        self.assertEqual(read_snapshot(path), ([], 3))
+        with open(path, "ab") as f:
+            f.write(b"x")
+        with self.assertRaises(ValueError):
+            read_snapshot(path)
+
+    def test_replay(self):
+        journal, pending, number = self.open()
+        self.assertEqual((pending, number), ([], 0))
+        journal.add(self.items(0, 4))
+        journal.deliver([0, 1])
+        journal.add(self.items(4, 2))
+        journal, pending, number = self.open()
+        self.assertEqual(sorted(pending), self.items(2, 4))
+        self.assertEqual(number, 6)
+        self.assertEqual(journal.events, 8)
+
+    def test_cut_last_line(self):
+        for tail in ('["deliver", [0', '["deliver", [0]]'):
+            with self.subTest(tail=tail):
+                self.directory = tempfile.mkdtemp(dir=self.directory)
+                journal, pending, number = self.open()
+                journal.add(self.items(0, 3))
+                journal.file.close()
+                with open(journal.journal_path, "a", encoding="utf-8") as f:
+                    f.write(tail)
+                journal, pending, number = self.open()
+                # the cut line is dropped, so lines written after it are read again
+                self.assertEqual(sorted(pending), self.items(0, 3))
+                journal.deliver([1])
+                journal, pending, number = self.open()
+                self.assertEqual(sorted(pending), self.items(0, 1) + self.items(2, 1))
+
+    def test_compact(self):
+        journal, pending, number = self.open()
+        journal.add(self.items(0, 5))
+        journal.deliver([0])
+        journal.compact(sorted(self.items(1, 4)), 5)
+        self.assertEqual(journal.events, 0)
+        self.assertEqual(os.path.getsize(journal.journal_path), 0)
+        journal.add(self.items(5, 1))
+        journal, pending, number = self.open()
+        self.assertEqual(sorted(pending), self.items(1, 5))
+        self.assertEqual(number, 6)
+
+    def test_stopped_before_journal_reset(self):
+        journal, pending, number = self.open()
+        journal.add(self.items(0, 5))
+        journal.deliver([0, 1])
+        journal.file.close()
+        # the snapshot is in place, but the journal still holds the events before it
+        write_snapshot(journal.snapshot_path, sorted(self.items(2, 3)), 5)
+        journal, pending, number = self.open()
+        self.assertEqual(sorted(pending), self.items(2, 3))
+        self.assertEqual(number, 5)
+
+    def test_deliver_from_snapshot(self):
+        journal, pending, number = self.open()
+        journal.compact(sorted(self.items(0, 100)), 100)
+        journal.add(self.items(100, 3))
+        # the earliest ones are delivered in order, and one from the middle after an import
+        journal.deliver([0, 1, 2])
+        journal.deliver([50, 101])
+        journal, pending, number = self.open()
+        expected = [item for item in self.items(0, 103) if item[1] not in (0, 1, 2, 50, 101)]
+        self.assertEqual(sorted(pending), expected)
+        self.assertEqual(pending[0], expected[0])
+        self.assertEqual(number, 103)
+        for i in range(1, len(pending)):
+            self.assertLessEqual(pending[(i - 1) // 2], pending[i])
+
+
+if __name__ == '__main__':
+    unittest.main()
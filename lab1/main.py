@@ -1,13 +1,19 @@
 import math
+import numpy as np
 import wx
 
+MAX_ARGS = 1000000
+
 class Function:
-    def __init__(self, func, text):
+    def __init__(self, func, text, vfunc=None):
         """
         @param func: delegate of type (double) -> double
         @param text: string
+        @param vfunc: optional delegate of type (ndarray) -> ndarray,
+            the same function applied to a whole array of args at once
         """
         self.func = func
+        self.vfunc = vfunc
         self.text = "f(x) = " + text
         pass
 
@@ -17,9 +23,65 @@ class Function:
     def apply(self, arg):
         return self.func(arg)
 
+    def evaluate(self, x):
+        """
+        Apply this function to array of args and return array of values
+        """
+        if self.vfunc is None:
+            return np.fromiter(map(self.func, x.tolist()), dtype=float, count=len(x))
+        with np.errstate(over="raise", divide="raise", invalid="raise"):
+            y = self.vfunc(x)
+        if np.ndim(y) == 0:
+            return np.full_like(x, y)
+        return np.asarray(y, dtype=float)
+
     def describe(self, arg):
         return f"f({arg}) = {self.func(arg)}"
 
+    def describe_many(self, args):
+        """
+        Apply this function to array of args in one pass
+        and return list of descriptions like describe does
+        """
+        try:
+            values = self.evaluate(args).tolist()
+        except ArithmeticError:
+            # find out which args fail, one by one
+            values = []
+            for arg in args.tolist():
+                try:
+                    values.append(self.func(arg))
+                except (ArithmeticError, ValueError) as error:
+                    values.append(f"error ({error})")
+        return [f"f({arg}) = {value}" for arg, value in zip(args.tolist(), values)]
+
+
+def parse_args(text):
+    """
+    Read arg values from text like "1, 2.5, 0:10:0.01", where
+    start:end:step is a range that includes its end, step is 1 by default
+    @return: array of args
+    """
+    parts = []
+    count = 0
+    for part in text.split(","):
+        bounds = [float(bound) for bound in part.split(":")]
+        if len(bounds) == 1:
+            size = 1
+        elif len(bounds) in (2, 3):
+            start, end, step = (bounds + [1.0])[:3]
+            if step == 0 or (end - start) / step < 0:
+                raise ValueError(f"range {part.strip()} is empty")
+            # a little tolerance keeps the end in when step is not exact in binary
+            size = math.floor((end - start) / step + 1e-9) + 1
+        else:
+            raise ValueError(f"can not read {part.strip()}")
+        count += size
+        if count > MAX_ARGS:
+            raise ValueError(f"more than {MAX_ARGS} args")
+        parts.append(np.array(bounds) if len(bounds) == 1 else start + np.arange(size) * step)
+    return np.concatenate(parts)
+
 
 class FunctionView(wx.Frame):
     def __init__(self, parent, functions):
@@ -86,17 +148,19 @@ class FunctionView(wx.Frame):
         if f_choice_index == wx.NOT_FOUND:
             print("Nothing was selected")
             return
-        # get argument value and do some safety checks
-        arg = 0
+        # get argument values and do some safety checks
         try:
-            arg = float(self.arg_input.GetValue())
-        except ValueError:
-            print("Can not convert argument to number")
+            args = parse_args(self.arg_input.GetValue())
+        except (ValueError, OverflowError) as error:
+            print(f"Can not convert argument to number: {error}")
             return
-        # apply function to argument and describe it all in output field
+        # apply function to all arguments at once and describe it all in output field
         func = self.functions[f_choice_index]
-        self.counter += 1
-        self.output.AppendText(f"[{self.counter}]: {func}, {func.describe(arg)} \n")
+        lines = []
+        for description in func.describe_many(args):
+            self.counter += 1
+            lines.append(f"[{self.counter}]: {func}, {description} \n")
+        self.output.AppendText("".join(lines))
         pass
 
 
@@ -106,11 +170,13 @@ class FuctionViewerApp(wx.App):
         self.functions = [
             Function (
                 lambda x: math.pow(10, 1+x*x) - math.pow(10, 1-x*x), 
-                "10^(1+x^2) - 10^(1-x^2)"
+                "10^(1+x^2) - 10^(1-x^2)",
+                lambda x: np.power(10.0, 1+x*x) - np.power(10.0, 1-x*x)
             ),
             Function (
                 lambda x: math.tan(3*x-156) + math.tan(x) - 4*math.sin(x), 
-                "tg(3x-156) + tg(x) - 4sin(x)"
+                "tg(3x-156) + tg(x) - 4sin(x)",
+                lambda x: np.tan(3*x-156) + np.tan(x) - 4*np.sin(x)
             )
         ]
         # Create a view and show it
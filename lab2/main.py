@@ -1,13 +1,20 @@
 import math
+import numpy as np
+import threading
 import wx
 
+EVALUATION_CHUNK = 65536
+
 class Function:
-    def __init__(self, func, text):
+    def __init__(self, func, text, vfunc=None):
         """
         @param func: delegate of type (double) -> double
         @param text: string
+        @param vfunc: optional delegate of type (ndarray) -> ndarray,
+            the same function applied to a whole array of args at once
         """
         self.func = func
+        self.vfunc = vfunc
         self.text = "f(x) = " + text
         pass
 
@@ -22,20 +29,170 @@ class Function:
         Apply this function to several arg values on given interval
         and return list of arg-value pairs
         """
+        x, y = self.sample(start, end, slices)
+        return SeriesBuffer(x, y)
+
+    def sample(self, start, end, slices, progress=None):
+        """
+        Apply this function to several arg values on given interval
+        in one batched call and return arrays of args and values
+        @param progress: optional delegate of type (double) -> bool,
+            makes evaluation go chunk by chunk, receives done fraction
+            after each chunk and stops evaluation by returning False.
+            Nothing is returned for stopped evaluation
+        """
+        if slices < 1:
+            raise ValueError("slices must be positive")
         a = min(start, end)
         b = max(start, end)
-        step = (b - a) / slices
-        result = []
-        for i in range(slices):
-            result.append((a, self.func(a)))
-            a += step
-        result.append((b, self.func(b)))
-        return result
+        x = np.linspace(a, b, slices + 1)
+        if progress is None:
+            return x, self.evaluate(x)
+        y = np.empty_like(x)
+        for i in range(0, len(x), EVALUATION_CHUNK):
+            j = min(i + EVALUATION_CHUNK, len(x))
+            y[i:j] = self.evaluate(x[i:j])
+            if progress(j / len(x)) is False:
+                return None
+        return x, y
+
+    def evaluate(self, x):
+        """
+        Apply this function to array of args and return array of values
+        """
+        if self.vfunc is None:
+            return np.fromiter(map(self.func, x.tolist()), dtype=float, count=len(x))
+        with np.errstate(over="raise", divide="raise", invalid="raise"):
+            y = self.vfunc(x)
+        if np.ndim(y) == 0:
+            return np.full_like(x, y)
+        return np.asarray(y, dtype=float)
 
     def describe(self, arg):
         return f"f({arg}) = {self.func(arg)}"
 
 
+class SeriesBuffer:
+    """
+    Read-only sequence of arg-value pairs stored interleaved in one
+    float64 array of shape (count, 2), 16 bytes per pair. Slices and
+    columns of args and values are views of the same memory, and
+    the buffer protocol exposes the pairs without copying
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, x, y):
+        self.data = np.empty((len(x), 2))
+        self.data[:, 0] = x
+        self.data[:, 1] = y
+
+    @classmethod
+    def from_pairs(cls, data):
+        """
+        Wrap an existing array of shape (count, 2) without copying
+        """
+        series = cls.__new__(cls)
+        series.data = data
+        return series
+
+    @property
+    def x(self):
+        return self.data[:, 0]
+
+    @property
+    def y(self):
+        return self.data[:, 1]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SeriesBuffer.from_pairs(self.data[index])
+        x, y = self.data[index].tolist()
+        return (x, y)
+
+    def __iter__(self):
+        return map(tuple, self.data.tolist())
+
+    def __buffer__(self, flags):
+        return memoryview(self.data)
+
+
+class EvaluationWorker:
+    """
+    Evaluates functions on a background thread chunk by chunk.
+    Progress, results and errors are delivered to the wx main thread
+    with wx.CallAfter. Starting a new evaluation supersedes the one
+    in progress: it stops after its current chunk and its results
+    are never delivered
+    """
+    def __init__(self, onProgress, onError):
+        """
+        @param onProgress: delegate of type (double) -> None
+        @param onError: delegate of type (Exception) -> None
+        """
+        self.onProgress = onProgress
+        self.onError = onError
+        self.generation = 0
+
+    def Start(self, func, start, end, slices, onDone):
+        """
+        Start evaluation of func on given interval
+        @param onDone: delegate of type (SeriesBuffer) -> None
+        """
+        self.generation += 1
+        thread = threading.Thread(target=self.Run, daemon=True,
+            args=(self.generation, func, start, end, slices, onDone))
+        thread.start()
+
+    def Cancel(self):
+        self.generation += 1
+
+    def Run(self, generation, func, start, end, slices, onDone):
+        def progress(fraction):
+            if generation != self.generation:
+                return False
+            wx.CallAfter(self.Deliver, generation, self.onProgress, fraction)
+        try:
+            result = func.sample(start, end, slices, progress)
+        except Exception as error:
+            wx.CallAfter(self.Deliver, generation, self.onError, error)
+            return
+        if result is not None:
+            wx.CallAfter(self.Deliver, generation, onDone, SeriesBuffer(*result))
+
+    def Deliver(self, generation, callback, *args):
+        # results of superseded or cancelled evaluations are dropped here
+        if generation == self.generation:
+            callback(*args)
+
+
+class FTable(wx.ListCtrl):
+    """
+    Virtual table of arg-value pairs. Rows are not stored in the widget,
+    they are formatted on demand when they become visible
+    """
+    def __init__(self, parent):
+        wx.ListCtrl.__init__(self, parent, -1, style=(wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_HRULES))
+        self.SetFont(wx.Font(10, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
+        self.InsertColumn(0, "#", wx.LIST_FORMAT_RIGHT, width=80)
+        self.InsertColumn(1, "x", wx.LIST_FORMAT_RIGHT, width=120)
+        self.InsertColumn(2, "f(x)", wx.LIST_FORMAT_RIGHT, width=120)
+        self.series = []
+
+    def SetData(self, series):
+        self.series = series
+        self.SetItemCount(len(series))
+        self.Refresh()
+
+    def OnGetItemText(self, item, column):
+        if column == 0:
+            return str(item)
+        x, y = self.series[item]
+        return f"{x:.3f}" if column == 1 else f"{y:.3f}"
+
+
 class FunctionView(wx.Frame):
     def __init__(self, parent, functions):
         """
@@ -47,7 +204,7 @@ class FunctionView(wx.Frame):
         # to create a panel and fill it with function descriptions
         panel = wx.Panel(self)
         sizer = wx.GridBagSizer(4, 20)
-        sizer.SetRows(6)
+        sizer.SetRows(7)
         sizer.SetCols(3)
         # to create first block: function selector
         text = wx.StaticText(panel, -1, "Function")
@@ -75,9 +232,15 @@ class FunctionView(wx.Frame):
         submit_button.SetCanFocus(False)
         sizer.Add(submit_button, wx.GBPosition(4, 2), flag=wx.ALIGN_RIGHT)
         # output body
-        output = wx.TextCtrl(panel, -1, style=(wx.TE_MULTILINE | wx.TE_READONLY))
-        output.SetFont(wx.Font(10, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
+        output = FTable(panel)
         sizer.Add(output, wx.GBPosition(5, 0), wx.GBSpan(1, 3), flag=wx.EXPAND)
+        # evaluation progress
+        progress = wx.Gauge(panel, -1, range=1000)
+        sizer.Add(progress, wx.GBPosition(6, 0), wx.GBSpan(1, 2), flag=wx.EXPAND | wx.ALIGN_CENTER_VERTICAL)
+        cancel_button = wx.Button(panel, -1, "✕", size=wx.Size(40, 32))
+        cancel_button.SetCanFocus(False)
+        cancel_button.Disable()
+        sizer.Add(cancel_button, wx.GBPosition(6, 2), flag=wx.ALIGN_RIGHT)
         # to finish the panel
         sizer.AddGrowableCol(0, 1)
         sizer.AddGrowableCol(1, 1)
@@ -101,8 +264,12 @@ class FunctionView(wx.Frame):
         self.slices_input = slices_input
         self.submit_button = submit_button
         self.output = output
+        self.progress = progress
+        self.cancel_button = cancel_button
+        self.worker = EvaluationWorker(self.OnProgress, self.OnEvaluationError)
         # bind event handlers
         submit_button.Bind(wx.EVT_BUTTON, self.OnSubmitButtonClick)
+        cancel_button.Bind(wx.EVT_BUTTON, self.OnCancelButtonClick)
         f_choice.Bind(wx.EVT_CHOICE, self.OnAnyInputChange)
         start_input.Bind(wx.EVT_TEXT, self.OnAnyInputChange)
         end_input.Bind(wx.EVT_TEXT, self.OnAnyInputChange)
@@ -127,13 +294,40 @@ class FunctionView(wx.Frame):
         except ValueError:
             print("Can not convert arguments to numbers")
             return
-        # apply function to argument and describe it all in output field
+        # apply function to argument in background, output is filled when done
         func = self.functions[f_choice_index]
-        self.output.SetValue("  #  |           x    |           f(x)\n")
-        cnt = 0
-        for x, y in func.apply(start, end, slices):
-            self.output.AppendText(f"{cnt:>4} | {x:>14.3f} | {y:>14.3f}\n")
-            cnt += 1
+        self.progress.SetValue(0)
+        self.cancel_button.Enable()
+        self.worker.Start(func, start, end, slices, self.FillOutput)
+        pass
+
+    def OnCancelButtonClick(self, event):
+        """
+        Handler for cancel button click event
+        @param event: event to handle
+        """
+        self.worker.Cancel()
+        self.StopProgress()
+        pass
+
+    def OnProgress(self, fraction):
+        self.progress.SetValue(int(fraction * self.progress.GetRange()))
+
+    def OnEvaluationError(self, error):
+        self.StopProgress()
+        print(f"Can not evaluate function: {error}")
+
+    def StopProgress(self):
+        self.progress.SetValue(0)
+        self.cancel_button.Disable()
+
+    def FillOutput(self, series):
+        """
+        Describe the series in output field
+        @param series: arg-value pairs to show
+        """
+        self.StopProgress()
+        self.output.SetData(series)
         self.submit_button.Disable()
         pass
 
@@ -152,11 +346,13 @@ class FuctionViewerApp(wx.App):
         self.functions = [
             Function (
                 lambda x: math.pow(10, 1+x*x) - math.pow(10, 1-x*x), 
-                "10^(1+x^2) - 10^(1-x^2)"
+                "10^(1+x^2) - 10^(1-x^2)",
+                lambda x: np.power(10.0, 1+x*x) - np.power(10.0, 1-x*x)
             ),
             Function (
                 lambda x: math.tan(3*x-156) + math.tan(x) - 4*math.sin(x), 
-                "tg(3x-156) + tg(x) - 4sin(x)"
+                "tg(3x-156) + tg(x) - 4sin(x)",
+                lambda x: np.tan(3*x-156) + np.tan(x) - 4*np.sin(x)
             )
         ]
         # Create a view and show it
@@ -1,16 +1,23 @@
 import math
+import numpy as np
+import threading
 import wx
 
 DEFAULT_COLOR = "#f03434"
 MIN_PLOT_SIZE = 10
+EVALUATION_CHUNK = 65536
+CLIP_GUARD = 1e150 # pixels, farther points are pulled in so that differences do not overflow
 
 class Function:
-    def __init__(self, func, text):
+    def __init__(self, func, text, vfunc=None):
         """
         @param func: delegate of type (double) -> double
         @param text: string
+        @param vfunc: optional delegate of type (ndarray) -> ndarray,
+            the same function applied to a whole array of args at once
         """
         self.func = func
+        self.vfunc = vfunc
         self.text = "f(x) = " + text
         pass
 
@@ -25,20 +32,238 @@ class Function:
         Apply this function to several arg values on given interval
         and return list of arg-value pairs
         """
+        x, y = self.sample(start, end, slices)
+        return SeriesBuffer(x, y)
+
+    def sample(self, start, end, slices, progress=None):
+        """
+        Apply this function to several arg values on given interval
+        in one batched call and return arrays of args and values
+        @param progress: optional delegate of type (double) -> bool,
+            makes evaluation go chunk by chunk, receives done fraction
+            after each chunk and stops evaluation by returning False.
+            Nothing is returned for stopped evaluation
+        """
+        if slices < 1:
+            raise ValueError("slices must be positive")
         a = min(start, end)
         b = max(start, end)
-        step = (b - a) / slices
-        result = []
-        for i in range(slices):
-            result.append((a, self.func(a)))
-            a += step
-        result.append((b, self.func(b)))
-        return result
+        x = np.linspace(a, b, slices + 1)
+        if progress is None:
+            return x, self.evaluate(x)
+        y = np.empty_like(x)
+        for i in range(0, len(x), EVALUATION_CHUNK):
+            j = min(i + EVALUATION_CHUNK, len(x))
+            y[i:j] = self.evaluate(x[i:j])
+            if progress(j / len(x)) is False:
+                return None
+        return x, y
+
+    def evaluate(self, x):
+        """
+        Apply this function to array of args and return array of values
+        """
+        if self.vfunc is None:
+            return np.fromiter(map(self.func, x.tolist()), dtype=float, count=len(x))
+        with np.errstate(over="raise", divide="raise", invalid="raise"):
+            y = self.vfunc(x)
+        if np.ndim(y) == 0:
+            return np.full_like(x, y)
+        return np.asarray(y, dtype=float)
 
     def describe(self, arg):
         return f"f({arg}) = {self.func(arg)}"
 
 
+class SeriesBuffer:
+    """
+    Read-only sequence of arg-value pairs stored interleaved in one
+    float64 array of shape (count, 2), 16 bytes per pair. Slices and
+    columns of args and values are views of the same memory, and
+    the buffer protocol exposes the pairs without copying
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, x, y):
+        self.data = np.empty((len(x), 2))
+        self.data[:, 0] = x
+        self.data[:, 1] = y
+
+    @classmethod
+    def from_pairs(cls, data):
+        """
+        Wrap an existing array of shape (count, 2) without copying
+        """
+        series = cls.__new__(cls)
+        series.data = data
+        return series
+
+    @property
+    def x(self):
+        return self.data[:, 0]
+
+    @property
+    def y(self):
+        return self.data[:, 1]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SeriesBuffer.from_pairs(self.data[index])
+        x, y = self.data[index].tolist()
+        return (x, y)
+
+    def __iter__(self):
+        return map(tuple, self.data.tolist())
+
+    def __buffer__(self, flags):
+        return memoryview(self.data)
+
+
+class EvaluationWorker:
+    """
+    Evaluates functions on a background thread chunk by chunk.
+    Progress, results and errors are delivered to the wx main thread
+    with wx.CallAfter. Starting a new evaluation supersedes the one
+    in progress: it stops after its current chunk and its results
+    are never delivered
+    """
+    def __init__(self, onProgress, onError):
+        """
+        @param onProgress: delegate of type (double) -> None
+        @param onError: delegate of type (Exception) -> None
+        """
+        self.onProgress = onProgress
+        self.onError = onError
+        self.generation = 0
+
+    def Start(self, func, start, end, slices, onDone):
+        """
+        Start evaluation of func on given interval
+        @param onDone: delegate of type (SeriesBuffer) -> None
+        """
+        self.generation += 1
+        thread = threading.Thread(target=self.Run, daemon=True,
+            args=(self.generation, func, start, end, slices, onDone))
+        thread.start()
+
+    def Cancel(self):
+        self.generation += 1
+
+    def Run(self, generation, func, start, end, slices, onDone):
+        def progress(fraction):
+            if generation != self.generation:
+                return False
+            wx.CallAfter(self.Deliver, generation, self.onProgress, fraction)
+        try:
+            result = func.sample(start, end, slices, progress)
+        except Exception as error:
+            wx.CallAfter(self.Deliver, generation, self.onError, error)
+            return
+        if result is not None:
+            wx.CallAfter(self.Deliver, generation, onDone, SeriesBuffer(*result))
+
+    def Deliver(self, generation, callback, *args):
+        # results of superseded or cancelled evaluations are dropped here
+        if generation == self.generation:
+            callback(*args)
+
+
+def decimate(px, py, width):
+    """
+    Pick points of a polyline that are enough to draw it: the first, the last,
+    the lowest and the highest point of every pixel column (M4 decimation).
+    Points to the left and to the right of the picture make one column each
+    @param px: ascending x coordinates of points in pixels
+    @param py: y coordinates of points in pixels
+    @param width: width of the picture in pixels
+    @return: ascending indices of points to keep
+    """
+    count = len(px)
+    index = np.arange(count)
+    if count <= 4 * (width + 2):
+        return index
+    column = np.clip(np.floor(px), -1, width)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+    lengths = np.diff(np.append(starts, count))
+    low = np.fmin.reduceat(py, starts)
+    high = np.fmax.reduceat(py, starts)
+    first_low = np.minimum.reduceat(np.where(py == np.repeat(low, lengths), index, count), starts)
+    first_high = np.minimum.reduceat(np.where(py == np.repeat(high, lengths), index, count), starts)
+    kept = np.concatenate((starts, starts + lengths - 1, first_low, first_high))
+    return np.unique(kept[kept < count])
+
+
+def clip_polyline(px, py, width, height):
+    """
+    Clip a polyline to the picture rectangle [0, width] x [0, height]
+    with Liang-Barsky algorithm applied to all segments at once.
+    Segments that cross the picture with both ends outside of it are kept,
+    segments with infinite or undefined ends are dropped
+    @param px: x coordinates of points in pixels
+    @param py: y coordinates of points in pixels
+    @return: list of runs of connected visible segments,
+        each run is a list of (x, y) integer points
+    """
+    finite = np.isfinite(px) & np.isfinite(py)
+    visible = finite[:-1] & finite[1:]
+    px = np.clip(px, -CLIP_GUARD, CLIP_GUARD)
+    py = np.clip(py, -CLIP_GUARD, CLIP_GUARD)
+    x0, y0, x1, y1 = px[:-1], py[:-1], px[1:], py[1:]
+    with np.errstate(all="ignore"):
+        dx = x1 - x0
+        dy = y1 - y0
+        t0 = np.zeros(len(dx))
+        t1 = np.ones(len(dx))
+        # sides of the picture where segments enter and leave it, -1 for ends inside
+        enter = np.full(len(dx), -1)
+        leave = np.full(len(dx), -1)
+        for side, (p, q) in enumerate(((-dx, x0), (dx, width - x0), (-dy, y0), (dy, height - y0))):
+            visible &= (p != 0) | (q >= 0)
+            r = q / p
+            entering = (p < 0) & (r > t0)
+            leaving = (p > 0) & (r < t1)
+            t0, enter = np.where(entering, r, t0), np.where(entering, side, enter)
+            t1, leave = np.where(leaving, r, t1), np.where(leaving, side, leave)
+        visible &= t0 <= t1
+        segments = np.flatnonzero(visible)
+        if len(segments) == 0:
+            return []
+        t0, t1 = t0[segments], t1[segments]
+        dx, dy = dx[segments], dy[segments]
+        begin = clip_point(x0[segments], y0[segments], dx, dy, enter[segments], width, height)
+        end = clip_point(x1[segments], y1[segments], dx, dy, leave[segments], width, height)
+    # a run goes on while segments follow each other and none of them is cut
+    joined = (np.diff(segments) == 1) & (t1[:-1] == 1) & (t0[1:] == 0)
+    bounds = np.concatenate(([0], np.flatnonzero(~joined) + 1, [len(segments)]))
+    runs = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        run = [tuple(begin[first].tolist())]
+        run.extend(map(tuple, end[first:last].tolist()))
+        runs.append(run)
+    return runs
+
+
+def clip_point(x, y, dx, dy, side, width, height):
+    """
+    Points where lines through (x, y) along (dx, dy) cross given sides of the
+    picture: 0 - left, 1 - right, 2 - top, 3 - bottom, -1 - the point itself.
+    The crossed coordinate is set exactly and the other one is found by slope,
+    so precision is not lost for ends far away from the picture
+    @return: array of (x, y) integer points
+    """
+    edge_x = np.where(side == 1, width, 0)
+    edge_y = np.where(side == 3, height, 0)
+    on_x = (side == 0) | (side == 1)
+    on_y = side >= 2
+    with np.errstate(all="ignore"):
+        cx = np.where(on_x, edge_x, np.where(on_y, x + (edge_y - y) * (dx / dy), x))
+        cy = np.where(on_y, edge_y, np.where(on_x, y + (edge_x - x) * (dy / dx), y))
+    return np.column_stack((cx, cy)).round().astype(int)
+
+
 class SinglePanelMdiChild(wx.MDIChildFrame):
     def __init__(self, parent):
         wx.MDIChildFrame.__init__(self, parent, -1)
@@ -66,6 +291,9 @@ class FPlot(wx.Panel):
         self.series = []
         self.description = ""
         self.color = DEFAULT_COLOR
+        self.background = None
+        self.curve = None
+        self.buffer = None
         self.plot = wx.Panel(self, -1)
         sizer = wx.GridBagSizer()
         sizer.SetRows(3)
@@ -82,35 +310,48 @@ class FPlot(wx.Panel):
         self.SetSizer(sizer)
         self.Layout()
         self.plot.SetBackgroundColour(wx.Colour(0xfbf8f5))
+        self.plot.SetBackgroundStyle(wx.BG_STYLE_PAINT)
         self.plot.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.plot.Bind(wx.EVT_SIZE, self.OnSize)
 
     def SetData(self, series, description=""):
         self.series = series
         self.text.SetLabel(description)
         width = max(abs(int(series[-1][0]-series[0][0])), MIN_PLOT_SIZE) * self.zoom
         self.plot.SetInitialSize(wx.Size(width, width))
-        self.plot.Refresh()
+        self.Invalidate()
 
     def SetLineColor(self, color):
         self.color = color
+        self.buffer = None
         self.plot.Refresh()
 
-    def OnPaint(self, event):
-        zoom = self.zoom
-        self.counter += 1
-        dc = wx.PaintDC(self.plot)
+    def OnSize(self, event):
+        self.Invalidate()
+        event.Skip()
 
-        print(f"[OnPaint {self.counter}] series length: {len(self.series)}")
-        if (len(self.series) < 2):
-            return
+    def Invalidate(self):
+        """
+        Drop all cached layers, they are drawn again on next paint
+        """
+        self.background = None
+        self.curve = None
+        self.buffer = None
+        self.plot.Refresh()
 
-        shifted = self.series[1::]
-        shifted.append(shifted[-1])
+    def GetOrigin(self, width, height):
+        zoom = self.zoom
+        return (width // 2 - int(self.series[0][0]+self.series[-1][0]) // 2 * zoom, height // 2)
 
+    def DrawBackground(self, dc, width, height):
+        """
+        Draw grid and coordinate axes
+        """
+        zoom = self.zoom
+        origin = self.GetOrigin(width, height)
         x_start = int(self.series[0][0]-MIN_PLOT_SIZE)
-
-        width, height = self.plot.GetSize()
-        origin = (width // 2 - int(self.series[0][0]+self.series[-1][0]) // 2 * zoom, height // 2)
+        dc.SetBackground(wx.Brush(self.plot.GetBackgroundColour()))
+        dc.Clear()
 
         # draw grid
         dc.SetPen(wx.Pen("#e8e9ef"))
@@ -130,38 +371,82 @@ class FPlot(wx.Panel):
         dc.DrawText("x", width-12, origin[1]+zoom//5)
         dc.DrawText("y", origin[0]-10, 1)
 
-        val_max = height 
-        arg_max = width
-        # draw function graph
+    def GetCurve(self, width, height):
+        """
+        Compute polyline runs of function graph in pixel coordinates
+        """
+        zoom = self.zoom
+        origin = self.GetOrigin(width, height)
+        px = origin[0] + self.series.x*zoom
+        py = origin[1] - self.series.y*zoom
+        kept = decimate(px, py, width)
+        return clip_polyline(px[kept], py[kept], width, height)
+
+    def DrawCurve(self, dc):
         try:
             dc.SetPen(wx.Pen(self.color))
         except:
             self.color = DEFAULT_COLOR
             dc.SetPen(wx.Pen(self.color))
-        for p1, p2 in zip(self.series, shifted):
-            x1 = origin[0] + p1[0]*zoom
-            y1 = origin[1] - p1[1]*zoom
-            x2 = origin[0] + p2[0]*zoom
-            y2 = origin[1] - p2[1]*zoom
-            if x1 < arg_max and x1 > 0 and y1 < val_max and y1 > 0 \
-                or x2 < arg_max and x2 > 0 and y2 < val_max and y2 > 0:
-                dc.DrawLine(int(x1), int(y1), int(x2), int(y2))
+        for run in self.curve:
+            dc.DrawLines(run)
+
+    def OnPaint(self, event):
+        self.counter += 1
+        dc = wx.PaintDC(self.plot)
 
+        print(f"[OnPaint {self.counter}] series length: {len(self.series)}")
+        width, height = self.plot.GetSize()
+        if (len(self.series) < 2 or width < 1 or height < 1):
+            dc.SetBackground(wx.Brush(self.plot.GetBackgroundColour()))
+            dc.Clear()
+            return
 
-class FTable(wx.TextCtrl):
+        # grid and axes are redrawn only after resize or data change,
+        # the curve is recomputed only after that too,
+        # and on color change the picture is put together from them again
+        if self.background is None:
+            self.background = wx.Bitmap(width, height)
+            layer = wx.MemoryDC(self.background)
+            self.DrawBackground(layer, width, height)
+            layer.SelectObject(wx.NullBitmap)
+        if self.curve is None:
+            self.curve = self.GetCurve(width, height)
+        if self.buffer is None:
+            self.buffer = wx.Bitmap(width, height)
+            layer = wx.MemoryDC(self.buffer)
+            layer.DrawBitmap(self.background, 0, 0)
+            self.DrawCurve(layer)
+            layer.SelectObject(wx.NullBitmap)
+        dc.DrawBitmap(self.buffer, 0, 0)
+
+
+class FTable(wx.ListCtrl):
+    """
+    Virtual table of arg-value pairs. Rows are not stored in the widget,
+    they are formatted on demand when they become visible
+    """
     def __init__(self, parent):
-        wx.TextCtrl.__init__(self, parent, -1, style=(wx.TE_MULTILINE | wx.TE_READONLY))
+        wx.ListCtrl.__init__(self, parent, -1, style=(wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_HRULES))
         self.SetFont(wx.Font(10, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
-        self.SetCanFocus(False)
-        self.Fit()
+        self.InsertColumn(0, "#", wx.LIST_FORMAT_RIGHT, width=80)
+        self.InsertColumn(1, "x", wx.LIST_FORMAT_RIGHT, width=120)
+        self.InsertColumn(2, "f(x)", wx.LIST_FORMAT_RIGHT, width=120)
+        self.series = []
+        self.SetMinSize((330, 400))
         self.Layout()
 
     def SetData(self, series):
-        cnt = 0
-        self.SetValue("  #             x               f(x)\n")
-        for x, y in series:
-            self.AppendText(f"{cnt:>4}  {x:>14.3f}  {y:>15.3g}\n")
-            cnt += 1
+        self.series = series
+        self.SetItemCount(len(series))
+        self.Refresh()
+
+    def OnGetItemText(self, item, column):
+        if column == 0:
+            return str(item)
+        x, y = self.series[item]
+        return f"{x:.3f}" if column == 1 else f"{y:.3g}"
+
 
 class FunctionView(wx.Panel):
     def __init__(self, parent, functions, onTableButton, onPlotButton):
@@ -211,6 +496,13 @@ class FunctionView(wx.Panel):
         plot_button = wx.Button(panel, -1, "Графік")
         plot_button.SetCanFocus(False)
         sizer.Add(plot_button, wx.GBPosition(6, 2), flag=wx.EXPAND)
+        # evaluation progress
+        progress = wx.Gauge(panel, -1, range=1000)
+        sizer.Add(progress, wx.GBPosition(5, 0), wx.GBSpan(1, 2), flag=wx.EXPAND | wx.ALIGN_CENTER_VERTICAL)
+        cancel_button = wx.Button(panel, -1, "Скасувати")
+        cancel_button.SetCanFocus(False)
+        cancel_button.Disable()
+        sizer.Add(cancel_button, wx.GBPosition(5, 2), flag=wx.EXPAND)
         # finish panel layout
         panel.SetSizer(sizer)
         panel.Layout()
@@ -233,18 +525,26 @@ class FunctionView(wx.Panel):
         self.table_button = table_button
         self.plot_button = plot_button
         self.color_hex_input = color_hex_input
+        self.progress = progress
+        self.cancel_button = cancel_button
+        self.worker = EvaluationWorker(self.OnProgress, self.OnEvaluationError)
         # bind event handlers
-        table_button.Bind(wx.EVT_BUTTON, lambda event: onTableButton(self.OnSubmit()))
-        plot_button.Bind(wx.EVT_BUTTON, lambda event: onPlotButton(self.OnSubmit()))
+        table_button.Bind(wx.EVT_BUTTON, lambda event: self.OnSubmit(onTableButton))
+        plot_button.Bind(wx.EVT_BUTTON, lambda event: self.OnSubmit(onPlotButton))
+        cancel_button.Bind(wx.EVT_BUTTON, lambda event: self.OnCancel())
         pass
 
-    def OnSubmit(self):
+    def OnSubmit(self, onDone):
+        """
+        Evaluate selected function in background
+        @param onDone: delegate that receives (series, description, color)
+        """
         # get choice index and do some safety checks
         f_choice_index = self.f_choice.GetSelection()
         color = self.color_hex_input.GetValue()
         if f_choice_index == wx.NOT_FOUND:
             self.Error("Для початку оберіть функцію з переліку.")
-            return ([], "", color)
+            return
         # get argument value and do some safety checks
         try:
             start = float(self.start_input.GetValue())
@@ -252,15 +552,30 @@ class FunctionView(wx.Panel):
             slices = int(self.slices_input.GetValue())
         except ValueError:
             self.Error("Не вдалося перетворити введені параметри в число. Спробуйте з іншими значеннями.")
-            return ([], "", color)
-        # apply function to argument and describe it all in output field
-        try:
-            func = self.functions[f_choice_index]
-            series = func.apply(start, end, slices)
-        except:
-            self.Error("При обчисленні значень функції виникла помилка. Спробуйте задати інші значення.")
-            return ([], "", color)
-        return (series, str(func), color)
+            return
+        # apply function to argument in background
+        func = self.functions[f_choice_index]
+        def done(series):
+            self.StopProgress()
+            onDone((series, str(func), color))
+        self.progress.SetValue(0)
+        self.cancel_button.Enable()
+        self.worker.Start(func, start, end, slices, done)
+
+    def OnCancel(self):
+        self.worker.Cancel()
+        self.StopProgress()
+
+    def OnProgress(self, fraction):
+        self.progress.SetValue(int(fraction * self.progress.GetRange()))
+
+    def OnEvaluationError(self, error):
+        self.StopProgress()
+        self.Error("При обчисленні значень функції виникла помилка. Спробуйте задати інші значення.")
+
+    def StopProgress(self):
+        self.progress.SetValue(0)
+        self.cancel_button.Disable()
 
     def Error(self, message):
         print(message)
@@ -273,15 +588,18 @@ class FuctionViewerApp(wx.App):
         functions = [
             Function (
                 lambda x: math.pow(10, 1+x*x) - math.pow(10, 1-x*x), 
-                "10^(1+x^2) - 10^(1-x^2)"
+                "10^(1+x^2) - 10^(1-x^2)",
+                lambda x: np.power(10.0, 1+x*x) - np.power(10.0, 1-x*x)
             ),
             Function (
                 lambda x: math.tan(3*x-156) + math.tan(x) - 4*math.sin(x), 
-                "tg(3x-156) + tg(x) - 4sin(x)"
+                "tg(3x-156) + tg(x) - 4sin(x)",
+                lambda x: np.tan(3*x-156) + np.tan(x) - 4*np.sin(x)
             ),
             Function (
                 lambda x: math.sin(x) + math.exp(x/9),
-                "sin(x) + exp(x/9)"
+                "sin(x) + exp(x/9)",
+                lambda x: np.sin(x) + np.exp(x/9)
             )
         ]
         self.plotCount = 0
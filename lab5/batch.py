@@ -0,0 +1,113 @@
+"""
+Evaluate functions for parameter files written by lab5 and save the results,
+without a display. Usage:
+
+    python batch.py params.json [more.json ...] [-f csv] [-o out] [-j 4]
+
+Each file holds one object with choice_index, start, end, slices and color,
+as saved by the main window, or a list of them. An optional "function" key
+with the text of the function overrides choice_index. Jobs that fail are
+reported and skipped, and the exit status is 1 if any of them failed
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from core import BUILTIN_FUNCTIONS, EXPORT_FORMATS, compile_function, export_series
+
+OUTPUT_FORMATS = [ext[1:] for ext in EXPORT_FORMATS] + ["pdf"]
+
+
+def read_jobs(path):
+    """
+    Read parameter objects from a file
+    @return: list of (name, parameters), name is unique for every object
+    """
+    with open(path, "r") as f:
+        data = json.loads(f.read())
+    name = os.path.splitext(os.path.basename(path))[0]
+    if isinstance(data, dict):
+        return [(name, data)]
+    return [(f"{name}-{i}", item) for i, item in enumerate(data)]
+
+
+def job_function(data):
+    """
+    @return: Function given by text or by index of a built-in function
+    """
+    text = data.get("function")
+    if not text:
+        index = int(data["choice_index"])
+        # -1 is saved when no function was selected
+        if not 0 <= index < len(BUILTIN_FUNCTIONS):
+            raise ValueError(f"no function with index {index}")
+        text = BUILTIN_FUNCTIONS[index]
+    return compile_function(text)
+
+
+def run_job(job):
+    """
+    Evaluate function for one parameter object and write output file
+    @param job: (parameters, output path)
+    @return: (output path, nothing) or (output path, error message) if the job failed
+    """
+    data, path = job
+    try:
+        func = job_function(data)
+        start = float(data["start"])
+        end = float(data["end"])
+        slices = int(data["slices"])
+        export_series(path, func.chunks(start, end, slices), slices + 1, title=str(func))
+    except Exception as error:
+        # one bad job must not stop the others, the unfinished file is already removed
+        return path, f"{type(error).__name__}: {error}"
+    return path, None
+
+
+def report(results):
+    """
+    Print output paths of done jobs and errors of failed ones as they come
+    @param results: iterable of what run_job returns
+    @return: count of failed jobs
+    """
+    failed = 0
+    for path, error in results:
+        if error is None:
+            print(path)
+        else:
+            print(f"{path}: {error}", file=sys.stderr)
+            failed += 1
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate lab5 parameter files without a display")
+    parser.add_argument("files", nargs="+", help="JSON parameter files")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="csv", help="output format")
+    parser.add_argument("-o", "--output", default=".", help="output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="count of parallel processes")
+    args = parser.parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    jobs = []
+    failed = 0
+    for path in args.files:
+        try:
+            for name, data in read_jobs(path):
+                jobs.append((data, os.path.join(args.output, f"{name}.{args.format}")))
+        except (OSError, ValueError) as error:
+            print(f"{path}: {type(error).__name__}: {error}", file=sys.stderr)
+            failed += 1
+    if args.jobs > 1 and len(jobs) > 1:
+        with multiprocessing.Pool(min(args.jobs, len(jobs))) as pool:
+            failed += report(pool.imap(run_job, jobs))
+    else:
+        failed += report(map(run_job, jobs))
+    if failed:
+        print(f"{failed} failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Benchmarks for lab5. Usage:
+
+    python bench.py startup [-n 5] [--max-import 300] [--max-window 1500]
+    python bench.py run [-o results.json] [--max-slices 10000000] [--max-workers 32]
+    python bench.py compare base.json results.json [--threshold 0.2]
+
+Startup is measured in fresh interpreters, so module caches of this
+process do not affect it. Window benchmarks need a display, on a server
+run them with xvfb-run; without wx they are skipped
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from core import (BUILTIN_FUNCTIONS, PARALLEL_WORKERS, SeriesBuffer, ParallelEvaluator,
+    compile_function, export_series)
+
+LAB_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+STARTUP_IMPORT_THRESHOLD = 300 # ms
+STARTUP_WINDOW_THRESHOLD = 1500 # ms
+BENCH_SLICES = [10 ** power for power in range(2, 8)]
+BENCH_PDF_ROWS = [10 ** power for power in range(3, 7)]
+BENCH_PARALLEL_SLICES = [10 ** 5, 5 * 10 ** 5, 2 * 10 ** 6, 10 ** 7]
+BENCH_REPEAT = 3
+BENCH_PLOT_SIZE = (800, 600)
+COMPARE_THRESHOLD = 0.2 # allowed relative slowdown
+
+# Code run in a fresh interpreter, prints times in ms since its start
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import json, os, sys
+import core
+core_done = time.perf_counter()
+import main
+import_done = time.perf_counter()
+import wx
+app = main.FuctionViewerApp()
+def report():
+    window_done = time.perf_counter()
+    print(json.dumps({
+        "core": (core_done - start) * 1000,
+        "import": (import_done - start) * 1000,
+        "window": (window_done - start) * 1000,
+        "heavy": sorted(name for name in ("weasyprint", "wx.lib.dialogs") if name in sys.modules)
+    }))
+    sys.stdout.flush()
+    os._exit(0)
+# runs after the first window is shown and the event loop is idle
+wx.CallAfter(report)
+app.MainLoop()
+"""
+
+
+def run_script(script):
+    """
+    Run python code in a fresh interpreter inside lab directory
+    @return: object printed by the code as JSON
+    """
+    result = subprocess.run([sys.executable, "-c", script], cwd=LAB_DIRECTORY,
+        capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(runs):
+    """
+    Measure time to import core and main modules and to show the first window
+    @return: medians in ms and names of heavy modules loaded at startup
+    """
+    samples = [run_script(STARTUP_SCRIPT) for _ in range(runs)]
+    result = { name: statistics.median(sample[name] for sample in samples) for name in ("core", "import", "window") }
+    result["heavy"] = samples[-1]["heavy"]
+    return result
+
+
+def measure(action, repeat=BENCH_REPEAT):
+    """
+    @return: best time of several calls of action in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_apply(results, max_slices):
+    for index, text in enumerate(BUILTIN_FUNCTIONS):
+        func = compile_function(text)
+        for slices in BENCH_SLICES:
+            if slices <= max_slices:
+                results[f"apply/{index}/{slices}"] = measure(lambda: func.apply(-10, 10, slices))
+
+
+def bench_parallel(results, max_slices, max_workers):
+    """
+    Time ParallelEvaluator with 1, 2, 4... processes to see how it scales,
+    and next to the same series evaluated by one process, to see from
+    which size the pool pays off. Pools are started before timing
+    """
+    func = compile_function(BUILTIN_FUNCTIONS[-1])
+    sizes = [slices for slices in BENCH_PARALLEL_SLICES if slices <= max_slices]
+    for slices in sizes:
+        results[f"serial/{slices}"] = measure(lambda: func.sample(-10, 10, slices))
+    workers = 1
+    while workers <= max_workers:
+        evaluator = ParallelEvaluator(workers)
+        try:
+            evaluator.apply(func, -10, 10, workers)
+            for slices in sizes:
+                results[f"parallel/{workers}/{slices}"] = measure(lambda: evaluator.apply(func, -10, 10, slices))
+        finally:
+            evaluator.close()
+        workers *= 2
+
+
+def bench_pdf(results, max_slices):
+    func = compile_function(BUILTIN_FUNCTIONS[-1])
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "table.pdf")
+        for rows in BENCH_PDF_ROWS:
+            if rows <= max_slices:
+                # the same path as FunctionView.ToPdf takes
+                results[f"pdf/{rows}"] = measure(lambda: export_series(path,
+                    func.chunks(-10, 10, rows - 1), rows, title=str(func)))
+
+
+def bench_widgets(results, max_slices):
+    """
+    Time FTable.SetData with a screenful of rows and FPlot painted
+    into an offscreen bitmap, from scratch and from cached layers
+    """
+    import wx
+    import main
+    app = wx.App()
+    frame = wx.Frame(None)
+    table = main.FTable(frame)
+    plot = main.FPlot(frame)
+    bitmap = wx.Bitmap(*BENCH_PLOT_SIZE)
+    dc = wx.MemoryDC(bitmap)
+    func = compile_function(BUILTIN_FUNCTIONS[-1])
+    def fill(series):
+        table.SetData(series)
+        for item in range(40):
+            for column in range(3):
+                table.OnGetItemText(item, column)
+    def paint(series):
+        plot.SetData(series)
+        plot.Render(dc, *BENCH_PLOT_SIZE)
+    for slices in BENCH_SLICES:
+        if slices <= max_slices:
+            series = SeriesBuffer(*func.sample(-10, 10, slices))
+            series.build_pyramid() # as evaluation threads do, paint only takes it
+            results[f"table/{slices}"] = measure(lambda: fill(series))
+            results[f"paint/{slices}"] = measure(lambda: paint(series))
+            results[f"repaint/{slices}"] = measure(lambda: plot.Render(dc, *BENCH_PLOT_SIZE))
+    dc.SelectObject(wx.NullBitmap)
+    frame.Destroy()
+    app.Destroy()
+
+
+def bench_all(max_slices, max_workers):
+    """
+    @return: object with environment description and times in seconds
+    """
+    results = {}
+    bench_apply(results, max_slices)
+    bench_parallel(results, max_slices, max_workers)
+    bench_pdf(results, max_slices)
+    skipped = []
+    try:
+        bench_widgets(results, max_slices)
+    except ImportError:
+        skipped.append("widgets")
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "cpus": os.cpu_count(),
+            "machine": platform.platform(),
+            "skipped": skipped
+        },
+        "results": results
+    }
+
+
+def compare(base, current, threshold):
+    """
+    @return: list of (name, base time, current time, ratio) for benchmarks
+        present in both runs, and list of names that got slower than threshold allows
+    """
+    rows = []
+    slower = []
+    for name, time_base in base["results"].items():
+        if name in current["results"]:
+            ratio = current["results"][name] / time_base
+            rows.append((name, time_base, current["results"][name], ratio))
+            if ratio > 1 + threshold:
+                slower.append(name)
+    return rows, slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for lab5")
+    commands = parser.add_subparsers(dest="command", required=True)
+    startup = commands.add_parser("startup", help="import time and time to first window")
+    startup.add_argument("-n", "--runs", type=int, default=5, help="count of runs, median is reported")
+    startup.add_argument("--max-import", type=float, default=STARTUP_IMPORT_THRESHOLD, help="threshold in ms")
+    startup.add_argument("--max-window", type=float, default=STARTUP_WINDOW_THRESHOLD, help="threshold in ms")
+    run = commands.add_parser("run", help="time evaluation, table, painting and PDF export")
+    run.add_argument("-o", "--output", help="file to save results to as JSON")
+    run.add_argument("--max-slices", type=int, default=BENCH_SLICES[-1], help="skip larger sizes")
+    run.add_argument("--max-workers", type=int, default=PARALLEL_WORKERS, help="most processes for parallel evaluation")
+    comparison = commands.add_parser("compare", help="compare two saved runs")
+    comparison.add_argument("base", help="JSON results of the reference run")
+    comparison.add_argument("current", help="JSON results of the run to check")
+    comparison.add_argument("--threshold", type=float, default=COMPARE_THRESHOLD, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        result = bench_startup(args.runs)
+        print(f"import core   {result['core']:8.1f} ms")
+        print(f"import main   {result['import']:8.1f} ms (max {args.max_import:.0f})")
+        print(f"first window  {result['window']:8.1f} ms (max {args.max_window:.0f})")
+        failed = result["import"] > args.max_import or result["window"] > args.max_window
+        if result["heavy"]:
+            print("loaded at startup: " + ", ".join(result["heavy"]))
+            failed = True
+        if failed:
+            print("startup regression")
+            return 1
+    elif args.command == "run":
+        data = bench_all(args.max_slices, args.max_workers)
+        for name, seconds in data["results"].items():
+            print(f"{name:20} {seconds * 1000:12.3f} ms")
+        for name in data["meta"]["skipped"]:
+            print(f"{name} skipped, wx is not available")
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(json.dumps(data, indent=2) + "\n")
+    elif args.command == "compare":
+        with open(args.base, "r") as f:
+            base = json.loads(f.read())
+        with open(args.current, "r") as f:
+            current = json.loads(f.read())
+        rows, slower = compare(base, current, args.threshold)
+        for name, time_base, time_current, ratio in rows:
+            mark = "  slower" if name in slower else ""
+            print(f"{name:20} {time_base * 1000:12.3f} {time_current * 1000:12.3f} ms {ratio:7.2f}x{mark}")
+        if slower:
+            print(f"{len(slower)} benchmarks got slower by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1079 @@
+"""
+Evaluation, sampling and export of functions for lab5.
+Does not depend on wx, so it can be used without a display
+"""
+import math
+import functools
+import collections
+import numpy as np
+import zlib
+import re
+import os
+import threading
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory
+
+EVALUATION_CHUNK = 65536
+ADAPTIVE_TOLERANCE = 1e-3 # of typical value magnitude
+ADAPTIVE_MIN_WIDTH = 1e-9 # of interval width
+ADAPTIVE_CLIP = 100 # typical value magnitudes
+PDF_PAGE_SIZE = (595.28, 841.89) # A4 in points
+PDF_MARGIN = 42.5 # 1.5 cm
+PDF_FONT_SIZE = 9
+PDF_ROW_HEIGHT = 13
+PDF_CELL_PADDING = 8
+PDF_COMPRESSION = 1 # zlib level, speed matters more than size here
+EXPORT_FORMATS = { ".csv": "CSV", ".txt": "Text table", ".bin": "Raw float64", ".npy": "NumPy" }
+SERIES_CACHE_BUDGET = 256 * 1024 * 1024 # bytes
+PYRAMID_MIN_LEVEL = 3 # blocks of fewer points give no fewer points to draw than they have
+CLIP_GUARD = 1e150 # pixels, farther points are pulled in so that differences do not overflow
+PARALLEL_WORKERS = os.cpu_count() or 1
+PARALLEL_MIN_SLICES = 2000000 # about where two processes catch up with one, see bench.py run
+PARALLEL_TASKS_PER_WORKER = 4 # more tasks than workers balance the load and report progress
+BUILTIN_FUNCTIONS = [
+    "10^(1+x^2) - 10^(1-x^2)",
+    "tg(3x-156) + tg(x) - 4sin(x)",
+    "sin(x) + exp(x/9)"
+]
+
+class Function:
+    def __init__(self, func, text, vfunc=None):
+        """
+        @param func: delegate of type (double) -> double
+        @param text: string
+        @param vfunc: optional delegate of type (ndarray) -> ndarray,
+            the same function applied to a whole array of args at once
+        """
+        self.func = func
+        self.vfunc = vfunc
+        self.text = "f(x) = " + text
+        pass
+
+    def __repr__(self):
+        return self.text
+
+    def apply(self, arg):
+        return self.func(arg)
+
+    def apply(self, start, end, slices):
+        """
+        Apply this function to several arg values on given interval
+        and return list of arg-value pairs
+        """
+        x, y = self.sample(start, end, slices)
+        return SeriesBuffer(x, y)
+
+    def sample(self, start, end, slices, progress=None):
+        """
+        Apply this function to several arg values on given interval
+        in one batched call and return arrays of args and values
+        @param progress: optional delegate of type (double) -> bool,
+            makes evaluation go chunk by chunk, receives done fraction
+            after each chunk and stops evaluation by returning False.
+            Nothing is returned for stopped evaluation
+        """
+        if slices < 1:
+            raise ValueError("slices must be positive")
+        a = min(start, end)
+        b = max(start, end)
+        x = np.linspace(a, b, slices + 1)
+        if progress is None:
+            return x, self.evaluate(x)
+        y = np.empty_like(x)
+        j = 0
+        for _, values in self.chunks(start, end, slices):
+            y[j:j + len(values)] = values
+            j += len(values)
+            if progress(j / len(x)) is False:
+                return None
+        return x, y
+
+    def chunks(self, start, end, slices, first=0, size=EVALUATION_CHUNK, stop=None):
+        """
+        Apply this function to the same arg values as sample does,
+        but lazily, yielding arrays of args and values by size points
+        @param first: index of arg value to start from
+        @param stop: index of arg value to stop before, the end by default
+        """
+        if slices < 1:
+            raise ValueError("slices must be positive")
+        a = min(start, end)
+        b = max(start, end)
+        step = (b - a) / slices
+        stop = slices + 1 if stop is None else min(stop, slices + 1)
+        for i in range(first, stop, size):
+            x = a + np.arange(i, min(i + size, stop)) * step
+            if i + len(x) == slices + 1:
+                x[-1] = b
+            yield x, self.evaluate(x)
+
+    def sample_adaptive(self, start, end, budget, progress=None):
+        """
+        Apply this function to arg values on given interval, starting with
+        a uniform grid of half the budget. Its slices where values change sign
+        or jump across a large range are bisected while the jump does not
+        shrink, which tells a pole from a root. Slices of poles are marked
+        as discontinuities, with two points added around each of them.
+        The rest of the budget goes to splitting in halves the slices where
+        the graph bends more than the tolerance allows, until no such slices
+        are left or the budget is spent. Halves that change sign or jump while
+        their slice did not are looked over for poles the same way
+        @param budget: count of points to return at most
+        @param progress: the same as for sample
+        @return: arrays of args, values and discontinuity flags of slices
+        """
+        if budget < 2:
+            raise ValueError("budget must be at least 2")
+        a = min(start, end)
+        b = max(start, end)
+        x = np.linspace(a, b, budget // 2 + 1)
+        y = self.evaluate(x)
+        # typical magnitude of values sets the tolerance, and values far beyond it
+        # are clipped when measuring the bend, so that poles do not eat the budget
+        magnitude = 1 + np.median(np.abs(y[np.isfinite(y)]))
+        tolerance = ADAPTIVE_TOLERANCE * magnitude
+        limit = ADAPTIVE_CLIP * magnitude
+        min_width = (b - a) * ADAPTIVE_MIN_WIDTH
+        # until bends are measured, the steepest slices are split first
+        error = np.abs(np.diff(np.clip(y, -limit, limit)))
+        unsettled = np.ones(len(x) - 1, dtype=bool)
+        gaps = np.zeros(len(x) - 1, dtype=bool)
+        candidates = np.flatnonzero(self.suspects(y[:-1], y[1:], limit))
+        x, y, gaps, error, unsettled = self.split_poles(x, y, gaps, error, unsettled,
+            candidates, limit, min_width, budget)
+        while unsettled.any() and len(x) < budget:
+            # if budget is short, the slices with the largest error are split first,
+            # by half of it, so that poles they show have room left
+            slices = np.flatnonzero(unsettled)
+            if len(slices) > budget - len(x):
+                room = (budget - len(x) + 1) // 2
+                slices = np.sort(slices[np.argsort(-error[slices], kind="stable")[:room]])
+            x0, x1 = x[slices], x[slices + 1]
+            y0, y1 = y[slices], y[slices + 1]
+            xm = (x0 + x1) / 2
+            ym = self.evaluate(xm)
+            c0, c1, cm = np.clip(y0, -limit, limit), np.clip(y1, -limit, limit), np.clip(ym, -limit, limit)
+            bend = np.abs(cm - (c0 + c1) / 2)
+            split = (bend > tolerance) & ((x1 - x0) / 2 > min_width)
+            # a pole next to a root shows only in the halves of their slice
+            seen = self.suspects(y0, y1, limit)
+            left = self.suspects(y0, ym, limit) & ~seen
+            right = self.suspects(ym, y1, limit) & ~seen
+            # the left half takes place of the slice, the right one goes after it
+            error[slices] = bend
+            unsettled[slices] = split
+            error = np.insert(error, slices + 1, bend)
+            unsettled = np.insert(unsettled, slices + 1, split)
+            gaps = np.insert(gaps, slices + 1, False)
+            x = np.insert(x, slices + 1, xm)
+            y = np.insert(y, slices + 1, ym)
+            halves = slices + np.arange(len(slices))
+            candidates = np.sort(np.concatenate((halves[left], halves[right] + 1)))
+            x, y, gaps, error, unsettled = self.split_poles(x, y, gaps, error, unsettled,
+                candidates, limit, min_width, budget)
+            if progress is not None and progress(len(x) / budget) is False:
+                return None
+        return x, y, gaps
+
+    @staticmethod
+    def suspects(y0, y1, limit):
+        """
+        @return: flags of slices where values change sign or jump across the clipped range
+        """
+        with np.errstate(invalid="ignore"):
+            sign = np.sign(y0) * np.sign(y1) < 0
+        return sign | (np.abs(np.clip(y1, -limit, limit) - np.clip(y0, -limit, limit)) > limit)
+
+    def split_poles(self, x, y, gaps, error, unsettled, candidates, limit, min_width, budget):
+        """
+        Bisect candidate slices until they are as narrow as allowed, keeping
+        the half where values change sign, or else the half with the larger
+        jump. Slices whose jump shrinks hold roots or steep parts and are
+        dropped. Slices that still jump across the clipped range are poles:
+        ends of the narrow slice are inserted and it is marked as a gap,
+        as many as the budget of points allows
+        @param x, y, gaps, error, unsettled: the series and its slice flags to insert poles into
+        @param candidates: ascending indices of candidate slices
+        @return: arrays of args, values and the slice flags
+        """
+        x0, x1 = x[candidates], x[candidates + 1]
+        y0, y1 = y[candidates], y[candidates + 1]
+        slices = candidates
+        jump = np.abs(np.clip(y1, -limit, limit) - np.clip(y0, -limit, limit))
+        while len(x0) and np.any(x1 - x0 > min_width):
+            xm = (x0 + x1) / 2
+            ym = self.evaluate(xm)
+            c0, c1, cm = np.clip(y0, -limit, limit), np.clip(y1, -limit, limit), np.clip(ym, -limit, limit)
+            with np.errstate(invalid="ignore"):
+                left_sign = np.sign(y0) * np.sign(ym) < 0
+                right_sign = np.sign(ym) * np.sign(y1) < 0
+            left = np.where(left_sign | right_sign, left_sign, np.abs(cm - c0) >= np.abs(c1 - cm))
+            x0, y0 = np.where(left, x0, xm), np.where(left, y0, ym)
+            x1, y1 = np.where(left, xm, x1), np.where(left, ym, y1)
+            # the jump across a pole grows as its slice narrows, across a root it halves
+            narrowed = np.where(left, np.abs(cm - c0), np.abs(c1 - cm))
+            kept = narrowed >= 0.75 * jump
+            x0, x1, y0, y1, slices, jump = x0[kept], x1[kept], y0[kept], y1[kept], slices[kept], narrowed[kept]
+        pole = np.flatnonzero(jump > limit)[:max(budget - len(x), 0) // 2]
+        x0, x1, y0, y1, slices = x0[pole], x1[pole], y0[pole], y1[pole], slices[pole]
+        # a slice with a pole becomes three: left part, the gap and right part
+        where = np.repeat(slices + 1, 2)
+        pairs = lambda first, second: np.column_stack((first, second)).ravel()
+        gaps = np.insert(gaps, where, pairs(np.ones(len(slices), dtype=bool), gaps[slices]))
+        error = np.insert(error, where, pairs(np.zeros(len(slices)), error[slices]))
+        unsettled = np.insert(unsettled, where, pairs(np.zeros(len(slices), dtype=bool), unsettled[slices]))
+        x = np.insert(x, where, pairs(x0, x1))
+        y = np.insert(y, where, pairs(y0, y1))
+        return x, y, gaps, error, unsettled
+
+    def evaluate(self, x):
+        """
+        Apply this function to array of args and return array of values
+        """
+        if self.vfunc is None:
+            return np.fromiter(map(self.func, x.tolist()), dtype=float, count=len(x))
+        with np.errstate(over="raise", divide="raise", invalid="raise"):
+            y = self.vfunc(x)
+        if np.ndim(y) == 0:
+            return np.full_like(x, y)
+        return np.asarray(y, dtype=float)
+
+    def describe(self, arg):
+        return f"f({arg}) = {self.func(arg)}"
+
+
+class SeriesBuffer:
+    """
+    Read-only sequence of arg-value pairs stored interleaved in one
+    float64 array of shape (count, 2), 16 bytes per pair. Slices and
+    columns of args and values are views of the same memory, and
+    the buffer protocol exposes the pairs without copying
+    """
+    __slots__ = ("data", "gaps", "pyramid")
+
+    def __init__(self, x, y, gaps=None):
+        """
+        @param gaps: optional flags of discontinuous slices between pairs
+        """
+        self.data = np.empty((len(x), 2))
+        self.data[:, 0] = x
+        self.data[:, 1] = y
+        self.gaps = gaps
+        self.pyramid = None
+
+    @classmethod
+    def from_pairs(cls, data):
+        """
+        Wrap an existing array of shape (count, 2) without copying
+        """
+        series = cls.__new__(cls)
+        series.data = data
+        series.gaps = None
+        series.pyramid = None
+        return series
+
+    def build_pyramid(self):
+        """
+        Build MinMaxPyramid for plotting once, it takes a while for large
+        series, so evaluation threads build it right after the series
+        @return: the pyramid
+        """
+        if self.pyramid is None:
+            self.pyramid = MinMaxPyramid(self.x, self.y, self.gaps)
+        return self.pyramid
+
+    @property
+    def x(self):
+        return self.data[:, 0]
+
+    @property
+    def y(self):
+        return self.data[:, 1]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SeriesBuffer.from_pairs(self.data[index])
+        x, y = self.data[index].tolist()
+        return (x, y)
+
+    def __iter__(self):
+        return map(tuple, self.data.tolist())
+
+    def __buffer__(self, flags):
+        return memoryview(self.data)
+
+
+class SeriesCache:
+    """
+    LRU cache of evaluated series keyed by (function, start, end, slices, adaptive).
+    Least recently used series are evicted when total size of cached
+    arrays exceeds the memory budget
+    """
+    def __init__(self, budget=SERIES_CACHE_BUDGET):
+        """
+        @param budget: memory budget in bytes
+        """
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = collections.OrderedDict()
+
+    def __repr__(self):
+        return f"SeriesCache({len(self.entries)} series, {self.size} bytes, {self.hits} hits, {self.misses} misses)"
+
+    def get(self, key):
+        series = self.entries.get(key)
+        if series is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return series
+
+    def put(self, key, series):
+        size = self.size_of(series)
+        if size > self.budget:
+            return
+        if key in self.entries:
+            self.size -= self.size_of(self.entries.pop(key))
+        self.entries[key] = series
+        self.size += size
+        while self.size > self.budget:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= self.size_of(evicted)
+
+    def fetch(self, func, start, end, slices, adaptive=False):
+        """
+        Get series of func on given interval from cache or evaluate it
+        """
+        key = (func, min(start, end), max(start, end), slices, adaptive)
+        series = self.get(key)
+        if series is None:
+            if adaptive:
+                series = SeriesBuffer(*func.sample_adaptive(start, end, slices))
+            else:
+                series = func.apply(start, end, slices)
+            self.put(key, series)
+        return series
+
+    @staticmethod
+    def size_of(series):
+        size = series.x.nbytes + series.y.nbytes
+        if series.gaps is not None:
+            size += series.gaps.nbytes
+        if series.pyramid is not None:
+            size += series.pyramid.nbytes
+        return size
+
+
+def decimate(px, py, width):
+    """
+    Pick points of a polyline that are enough to draw it: the first, the last,
+    the lowest and the highest point of every pixel column (M4 decimation).
+    Points to the left and to the right of the picture make one column each
+    @param px: ascending x coordinates of points in pixels
+    @param py: y coordinates of points in pixels
+    @param width: width of the picture in pixels
+    @return: ascending indices of points to keep
+    """
+    count = len(px)
+    index = np.arange(count)
+    if count <= 4 * (width + 2):
+        return index
+    column = np.clip(np.floor(px), -1, width)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+    lengths = np.diff(np.append(starts, count))
+    low = np.fmin.reduceat(py, starts)
+    high = np.fmax.reduceat(py, starts)
+    first_low = np.minimum.reduceat(np.where(py == np.repeat(low, lengths), index, count), starts)
+    first_high = np.minimum.reduceat(np.where(py == np.repeat(high, lengths), index, count), starts)
+    kept = np.concatenate((starts, starts + lengths - 1, first_low, first_high))
+    return np.unique(kept[kept < count])
+
+
+class MinMaxPyramid:
+    """
+    Level of detail pyramid of a series with ascending args. For every level k
+    and every block of 2^k points it keeps indices of the lowest and the highest
+    point, so a view of any width is drawn from about four points per block
+    at the level with about one block per pixel column, without walking all points.
+    Levels below PYRAMID_MIN_LEVEL are not kept, all points of their blocks are drawn
+    """
+    def __init__(self, x, y, gaps=None):
+        """
+        @param gaps: discontinuity flags of slices, as Function.sample_adaptive returns
+        """
+        self.x = x
+        self.y = y
+        # count of gaps before every point, to find segments that span a gap
+        self.spanned = None if gaps is None else np.concatenate(([0], np.cumsum(gaps)))
+        self.levels = [None] # level 0 is the series itself
+        # 4 bytes per index is enough for any series that fits in memory of a desktop
+        low = high = np.arange(len(y), dtype=np.int32 if len(y) < 2**31 else np.int64)
+        while len(low) > 1:
+            low = self.merge(low, np.less)
+            high = self.merge(high, np.greater)
+            self.levels.append((low, high) if len(self.levels) >= PYRAMID_MIN_LEVEL else None)
+
+    @property
+    def nbytes(self):
+        size = sum(low.nbytes + high.nbytes for low, high in filter(None, self.levels))
+        if self.spanned is not None:
+            size += self.spanned.nbytes
+        return size
+
+    def merge(self, indices, better):
+        """
+        Pick the better point of every two neighbouring blocks, NaN values lose
+        """
+        even, odd = indices[0:len(indices) - 1:2], indices[1::2]
+        y_even, y_odd = self.y[even], self.y[odd]
+        merged = np.where(better(y_odd, y_even) | np.isnan(y_even), odd, even)
+        if len(indices) % 2:
+            merged = np.append(merged, indices[-1])
+        return merged
+
+    def query(self, start, end, columns):
+        """
+        @param start, end: visible interval of args
+        @param columns: count of pixel columns the interval is drawn on
+        @return: ascending indices of points enough to draw the visible part,
+            with one more point on each side so that the line reaches the edges
+        """
+        count = len(self.x)
+        first = max(int(np.searchsorted(self.x, start, "right")) - 1, 0)
+        last = min(int(np.searchsorted(self.x, end, "left")), count - 1)
+        if count == 0 or last < first:
+            return np.arange(0)
+        level = 0
+        while level + 1 < len(self.levels) and (last - first + 1) >> (level + 1) >= columns:
+            level += 1
+        if self.levels[level] is None:
+            return np.arange(first, last + 1)
+        low, high = self.levels[level]
+        blocks = np.arange(first >> level, (last >> level) + 1)
+        # the first, the lowest, the highest and the last point of every block, in order
+        kept = np.column_stack((np.maximum(blocks << level, first), low[blocks], high[blocks],
+            np.minimum(((blocks + 1) << level) - 1, last)))
+        kept.sort(axis=1)
+        kept = kept.ravel()
+        return kept[np.concatenate(([True], np.diff(kept) != 0))]
+
+
+def clip_polyline(px, py, width, height, breaks=None):
+    """
+    Clip a polyline to the picture rectangle [0, width] x [0, height]
+    with Liang-Barsky algorithm applied to all segments at once.
+    Segments that cross the picture with both ends outside of it are kept,
+    segments with infinite or undefined ends are dropped
+    @param px: x coordinates of points in pixels
+    @param py: y coordinates of points in pixels
+    @param breaks: optional flags of segments that must not be drawn
+    @return: list of runs of connected visible segments,
+        each run is a list of (x, y) integer points
+    """
+    finite = np.isfinite(px) & np.isfinite(py)
+    visible = finite[:-1] & finite[1:]
+    px = np.clip(px, -CLIP_GUARD, CLIP_GUARD)
+    py = np.clip(py, -CLIP_GUARD, CLIP_GUARD)
+    x0, y0, x1, y1 = px[:-1], py[:-1], px[1:], py[1:]
+    if breaks is not None:
+        visible &= ~breaks
+    with np.errstate(all="ignore"):
+        dx = x1 - x0
+        dy = y1 - y0
+        t0 = np.zeros(len(dx))
+        t1 = np.ones(len(dx))
+        # sides of the picture where segments enter and leave it, -1 for ends inside
+        enter = np.full(len(dx), -1)
+        leave = np.full(len(dx), -1)
+        for side, (p, q) in enumerate(((-dx, x0), (dx, width - x0), (-dy, y0), (dy, height - y0))):
+            visible &= (p != 0) | (q >= 0)
+            r = q / p
+            entering = (p < 0) & (r > t0)
+            leaving = (p > 0) & (r < t1)
+            t0, enter = np.where(entering, r, t0), np.where(entering, side, enter)
+            t1, leave = np.where(leaving, r, t1), np.where(leaving, side, leave)
+        visible &= t0 <= t1
+        segments = np.flatnonzero(visible)
+        if len(segments) == 0:
+            return []
+        t0, t1 = t0[segments], t1[segments]
+        dx, dy = dx[segments], dy[segments]
+        begin = clip_point(x0[segments], y0[segments], dx, dy, enter[segments], width, height)
+        end = clip_point(x1[segments], y1[segments], dx, dy, leave[segments], width, height)
+    # a run goes on while segments follow each other and none of them is cut
+    joined = (np.diff(segments) == 1) & (t1[:-1] == 1) & (t0[1:] == 0)
+    bounds = np.concatenate(([0], np.flatnonzero(~joined) + 1, [len(segments)]))
+    runs = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        run = [tuple(begin[first].tolist())]
+        run.extend(map(tuple, end[first:last].tolist()))
+        runs.append(run)
+    return runs
+
+
+def clip_point(x, y, dx, dy, side, width, height):
+    """
+    Points where lines through (x, y) along (dx, dy) cross given sides of the
+    picture: 0 - left, 1 - right, 2 - top, 3 - bottom, -1 - the point itself.
+    The crossed coordinate is set exactly and the other one is found by slope,
+    so precision is not lost for ends far away from the picture
+    @return: array of (x, y) integer points
+    """
+    edge_x = np.where(side == 1, width, 0)
+    edge_y = np.where(side == 3, height, 0)
+    on_x = (side == 0) | (side == 1)
+    on_y = side >= 2
+    with np.errstate(all="ignore"):
+        cx = np.where(on_x, edge_x, np.where(on_y, x + (edge_y - y) * (dx / dy), x))
+        cy = np.where(on_y, edge_y, np.where(on_x, y + (edge_x - x) * (dy / dx), y))
+    return np.column_stack((cx, cy)).round().astype(int)
+
+
+# Names that may be used in function text, with their scalar and array implementations
+EXPRESSION_FUNCTIONS = {
+    "sin": (math.sin, np.sin),
+    "cos": (math.cos, np.cos),
+    "tg": (math.tan, np.tan),
+    "tan": (math.tan, np.tan),
+    "arcsin": (math.asin, np.arcsin),
+    "arccos": (math.acos, np.arccos),
+    "arctg": (math.atan, np.arctan),
+    "exp": (math.exp, np.exp),
+    "ln": (math.log, np.log),
+    "lg": (math.log10, np.log10),
+    "sqrt": (math.sqrt, np.sqrt),
+    "abs": (abs, np.abs)
+}
+EXPRESSION_CONSTANTS = { "pi": math.pi, "e": math.e }
+EXPRESSION_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z_]\w*)|(\*\*|[-+*/^()]))")
+
+
+class ExpressionParser:
+    """
+    Recursive descent parser of function text like "tg(3x-156) + 4sin(x)".
+    Produces a tree of tuples: ("num", value), ("x",), ("neg", a),
+    ("+", a, b), ("-", a, b), ("*", a, b), ("/", a, b), ("^", a, b)
+    and ("call", name, a). Constant subtrees are folded while parsing
+    """
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = EXPRESSION_TOKEN.match(text, position)
+            if match is None or match.end() == position:
+                raise ValueError(f"unexpected symbol '{text[position:].strip()[:1]}'")
+            number, name, symbol = match.groups()
+            if number is not None:
+                value = float(number)
+                if not math.isfinite(value):
+                    raise ValueError(f"number {number} is too large")
+                self.tokens.append(("num", value))
+            elif name is not None:
+                self.tokens.append(("name", name))
+            else:
+                self.tokens.append(("sym", "^" if symbol == "**" else symbol))
+            position = match.end()
+        self.position = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("empty expression")
+        tree = self.sum()
+        if self.position < len(self.tokens):
+            raise ValueError(f"unexpected '{self.tokens[self.position][1]}'")
+        return tree
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self, symbol):
+        if self.peek() != ("sym", symbol):
+            raise ValueError(f"expected '{symbol}'")
+        self.position += 1
+
+    def sum(self):
+        tree = self.product()
+        while self.peek() in (("sym", "+"), ("sym", "-")):
+            self.position += 1
+            tree = fold_node((self.tokens[self.position-1][1], tree, self.product()))
+        return tree
+
+    def product(self):
+        tree = self.unary()
+        while True:
+            kind, value = self.peek()
+            if kind == "sym" and value in "*/":
+                self.position += 1
+                tree = fold_node((value, tree, self.unary()))
+            elif kind in ("num", "name") or (kind, value) == ("sym", "("):
+                # implicit multiplication: 3x, 4sin(x), 2(x+1)
+                tree = fold_node(("*", tree, self.power()))
+            else:
+                return tree
+
+    def unary(self):
+        if self.peek() == ("sym", "-"):
+            self.position += 1
+            return fold_node(("neg", self.unary()))
+        if self.peek() == ("sym", "+"):
+            self.position += 1
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        tree = self.atom()
+        if self.peek() == ("sym", "^"):
+            self.position += 1
+            tree = fold_node(("^", tree, self.unary()))
+        return tree
+
+    def atom(self):
+        kind, value = self.peek()
+        self.position += 1
+        if kind == "num":
+            return ("num", value)
+        if (kind, value) == ("sym", "("):
+            tree = self.sum()
+            self.take(")")
+            return tree
+        if kind == "name":
+            if value == "x":
+                return ("x",)
+            if value in EXPRESSION_CONSTANTS:
+                return ("num", EXPRESSION_CONSTANTS[value])
+            if value == "ctg":
+                self.take("(")
+                tree = fold_node(("/", ("num", 1.0), fold_node(("call", "tg", self.sum()))))
+                self.take(")")
+                return tree
+            if value in EXPRESSION_FUNCTIONS:
+                self.take("(")
+                tree = fold_node(("call", value, self.sum()))
+                self.take(")")
+                return tree
+            raise ValueError(f"unknown name '{value}'")
+        raise ValueError("unexpected end of expression" if kind is None else f"unexpected '{value}'")
+
+
+def node_operands(node):
+    if node[0] in ("num", "x"):
+        return ()
+    return node[2:] if node[0] == "call" else node[1:]
+
+
+def fold_node(node):
+    """
+    Replace node with a constant if all of its operands are constants
+    """
+    op = node[0]
+    operands = node_operands(node)
+    if not all(operand[0] == "num" for operand in operands):
+        return node
+    values = [operand[1] for operand in operands]
+    try:
+        if op == "neg": value = -values[0]
+        elif op == "+": value = values[0] + values[1]
+        elif op == "-": value = values[0] - values[1]
+        elif op == "*": value = values[0] * values[1]
+        elif op == "/": value = values[0] / values[1]
+        elif op == "^": value = math.pow(values[0], values[1])
+        else: value = EXPRESSION_FUNCTIONS[node[1]][0](values[0])
+    except (ArithmeticError, ValueError):
+        return node
+    if not math.isfinite(value):
+        return node
+    return ("num", float(value))
+
+
+def emit_kernel_source(tree):
+    """
+    Emit source of function kernel(x) that computes the tree.
+    Subtrees that occur more than once are computed once
+    and kept in temporary variables
+    """
+    uses = {}
+    def count(node):
+        uses[node] = uses.get(node, 0) + 1
+        if uses[node] > 1: return
+        for operand in node_operands(node):
+            count(operand)
+    count(tree)
+
+    lines = []
+    names = {}
+    def assign(node, code):
+        names[node] = f"t{len(names)}"
+        lines.append(f"    {names[node]} = {code}")
+        return names[node]
+    def emit(node):
+        if node in names: return names[node]
+        op = node[0]
+        if op == "num": return repr(node[1])
+        if op == "x": return "x"
+        if op == "neg": code = f"(-{emit(node[1])})"
+        elif op == "call": code = f"{node[1]}({emit(node[2])})"
+        elif op == "^" and node[2] == ("num", 2.0):
+            base = emit(node[1])
+            if not base.isidentifier():
+                base = assign(node[1], base)
+            code = f"({base} * {base})"
+        elif op == "^": code = f"pow({emit(node[1])}, {emit(node[2])})"
+        else: code = f"({emit(node[1])} {op} {emit(node[2])})"
+        if uses[node] > 1:
+            return assign(node, code)
+        return code
+    result = emit(tree)
+    return "def kernel(x):\n" + "".join(line + "\n" for line in lines) + f"    return {result}\n"
+
+
+@functools.lru_cache(maxsize=None)
+def compile_expression(text):
+    """
+    Compile function text into a pair of kernels:
+    (double) -> double and (ndarray) -> ndarray.
+    Results are cached by expression text
+    """
+    source = emit_kernel_source(ExpressionParser(text).parse())
+    code = compile(source, f"<f(x) = {text}>", "exec")
+    kernels = []
+    for implementation in (0, 1):
+        namespace = { name: pair[implementation] for name, pair in EXPRESSION_FUNCTIONS.items() }
+        namespace["pow"] = (math.pow, np.power)[implementation]
+        exec(code, namespace)
+        kernels.append(namespace["kernel"])
+    return tuple(kernels)
+
+
+def compile_function(text):
+    """
+    Create a Function from its text, e.g. "sin(x) + exp(x/9)"
+    """
+    text = re.sub(r"^\s*f\s*\(\s*x\s*\)\s*=", "", text).strip()
+    func, vfunc = compile_expression(text)
+    return Function(func, text, vfunc)
+
+
+class PdfTableWriter:
+    """
+    Writes a table of arg-value pairs to a PDF file page by page.
+    Rows are set in standard Courier font with fixed column widths,
+    so every page is written as soon as its rows are known and memory
+    does not depend on count of rows. Stripes and grid of a full page
+    are written once and shared by all full pages
+    """
+    ROW = "(%7d %15.3f %15.3f) '\n"
+
+    def __init__(self, path, title=""):
+        self.file = open(path, "wb")
+        self.offsets = [0, 0, 0, 0, 0] # object 0 is reserved, 2 is written on close
+        self.pages = []
+        self.count = 0
+        self.pending = (np.empty(0), np.empty(0))
+        width, height = PDF_PAGE_SIZE
+        self.char_width = PDF_FONT_SIZE * 0.6 # Courier is 600 units wide
+        self.table_width = len((self.ROW % (0, 0, 0))[1:-4]) * self.char_width + 2 * PDF_CELL_PADDING
+        self.left = (width - self.table_width) / 2
+        self.top = height - PDF_MARGIN
+        self.page_rows = int((self.top - PDF_MARGIN) // PDF_ROW_HEIGHT) - 1
+        self.title = title
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self.write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+        self.write_object(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self.chrome = self.write_stream(self.chrome_for(self.page_rows))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def write(self, x, y):
+        """
+        Append rows for arrays of args and values
+        """
+        if len(self.pending[0]):
+            x = np.concatenate((self.pending[0], x))
+            y = np.concatenate((self.pending[1], y))
+        full = len(x) - len(x) % self.page_rows
+        for i in range(0, full, self.page_rows):
+            self.write_page(x[i:i + self.page_rows], y[i:i + self.page_rows])
+        self.pending = (x[full:], y[full:])
+
+    def close(self):
+        if self.file.closed:
+            return
+        if len(self.pending[0]) or not self.pages:
+            self.write_page(*self.pending)
+        kids = " ".join(f"{page} 0 R" for page in self.pages)
+        self.write_object(2, f"<< /Type /Pages /Count {len(self.pages)} /Kids [{kids}] >>".encode())
+        xref = self.file.tell()
+        entries = [b"0000000000 65535 f \n"]
+        entries += [f"{offset:010} 00000 n \n".encode() for offset in self.offsets[1:]]
+        self.file.write(f"xref\n0 {len(self.offsets)}\n".encode() + b"".join(entries))
+        self.file.write(f"trailer\n<< /Size {len(self.offsets)} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        self.file.close()
+
+    def chrome_for(self, rows):
+        """
+        Content of a page with stripes, header and grid for given count of rows
+        """
+        left, top, width, step = self.left, self.top, self.table_width, PDF_ROW_HEIGHT
+        bottom = top - (rows + 1) * step
+        ops = [f"0.949 0.945 0.969 rg {left:.2f} {top - step:.2f} {width:.2f} {step:.2f} re f", "0.973 0.961 0.984 rg"]
+        ops += [f"{left:.2f} {top - (row + 2) * step:.2f} {width:.2f} {step:.2f} re" for row in range(1, rows, 2)]
+        ops += ["f", "0.271 0.263 0.286 RG 0.5 w"]
+        ops += [f"{left:.2f} {top - row * step:.2f} m {left + width:.2f} {top - row * step:.2f} l" for row in range(rows + 2)]
+        # column borders go through the middle of spaces between numbers
+        borders = (0, PDF_CELL_PADDING + 7.5 * self.char_width, PDF_CELL_PADDING + 23.5 * self.char_width, width)
+        ops += [f"{left + x:.2f} {top:.2f} m {left + x:.2f} {bottom:.2f} l" for x in borders]
+        ops.append("S")
+        return "\n".join(ops)
+
+    def write_page(self, x, y):
+        rows = len(x)
+        size = PDF_FONT_SIZE
+        text = ["0 g"]
+        if not self.pages and self.title:
+            title = self.title.encode("cp1252", "replace").decode("latin-1")
+            title = title.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            text.append(f"BT /F2 {size + 2} Tf {self.left:.2f} {self.top + 6:.2f} Td ({title}) Tj ET")
+        baseline = self.top - PDF_ROW_HEIGHT + (PDF_ROW_HEIGHT - size) / 2 + 1
+        text.append(f"BT /F1 {size} Tf {PDF_ROW_HEIGHT} TL {self.left + PDF_CELL_PADDING:.2f} {baseline:.2f} Td")
+        text.append(f"({'#':>7} {'x':>15} {'y':>15}) Tj")
+        # all rows of the page are formatted by one call
+        cells = np.column_stack((np.arange(self.count, self.count + rows), x, y))
+        text.append(self.ROW * rows % tuple(cells.ravel().tolist()) + "ET")
+        self.count += rows
+        chrome = self.chrome if rows == self.page_rows else self.write_stream(self.chrome_for(rows))
+        content = self.write_stream("\n".join(text))
+        number = len(self.offsets)
+        self.offsets.append(0)
+        width, height = PDF_PAGE_SIZE
+        self.write_object(number, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents [{chrome} 0 R {content} 0 R] >>").encode())
+        self.pages.append(number)
+
+    def write_stream(self, content):
+        data = zlib.compress(content.encode("latin-1"), PDF_COMPRESSION)
+        number = len(self.offsets)
+        self.offsets.append(0)
+        self.write_object(number, f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode() + data + b"\nendstream")
+        return number
+
+    def write_object(self, number, body):
+        self.offsets[number] = self.file.tell()
+        self.file.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+class LazySeries:
+    """
+    Sequence of arg-value pairs of a function that are evaluated
+    chunk by chunk when requested, keeping only the last chunk.
+    A chunk that can not be evaluated is remembered too, and every
+    pair of it raises the same error without evaluating it again
+    """
+    def __init__(self, func, start, end, slices):
+        self.func = func
+        self.start = start
+        self.end = end
+        self.slices = slices
+        self.first = None
+        self.chunk = None
+
+    def __len__(self):
+        return self.slices + 1
+
+    def __getitem__(self, index):
+        if not 0 <= index <= self.slices:
+            raise IndexError("series index out of range")
+        first = index - index % EVALUATION_CHUNK
+        if first != self.first:
+            self.first = first
+            try:
+                self.chunk = next(self.func.chunks(self.start, self.end, self.slices, first))
+            except (ArithmeticError, ValueError) as error:
+                self.chunk = error
+        if isinstance(self.chunk, Exception):
+            raise self.chunk.with_traceback(None)
+        x, y = self.chunk
+        return float(x[index - first]), float(y[index - first])
+
+    def __iter__(self):
+        for x, y in self.func.chunks(self.start, self.end, self.slices):
+            yield from zip(x.tolist(), y.tolist())
+
+
+def fill_shared(task):
+    """
+    Evaluate a part of series in a process of ParallelEvaluator pool and
+    write its pairs to shared memory, the function is compiled again from
+    its text here since compiled kernels can not be pickled
+    @param task: (function text, shared memory name, start, end, slices, first index, stop index)
+    @return: count of pairs written
+    """
+    text, name, start, end, slices, first, stop = task
+    func = compile_function(text)
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        data = np.ndarray((slices + 1, 2), buffer=memory.buf)
+        i = first
+        for x, y in func.chunks(start, end, slices, first, stop=stop):
+            data[i:i + len(x), 0] = x
+            data[i:i + len(x), 1] = y
+            i += len(x)
+        del data
+    finally:
+        memory.close()
+    return stop - first
+
+
+class ParallelEvaluator:
+    """
+    Evaluates large series on a pool of processes. The interval is split
+    into parts, and every process writes its pairs straight to a shared
+    memory block laid out like SeriesBuffer, so results are not pickled
+    nor copied: the series is a view of the block. The pool is started on
+    first use and kept for later evaluations
+    """
+    def __init__(self, workers=PARALLEL_WORKERS):
+        self.workers = workers
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def apply(self, func, start, end, slices, progress=None):
+        """
+        Apply func to the same arg values as Function.sample does
+        @param progress: optional delegate like of Function.sample,
+            receives done fraction after every part
+        @return: SeriesBuffer, or nothing if stopped by progress
+        """
+        if slices < 1:
+            raise ValueError("slices must be positive")
+        if not self.accepts(func):
+            raise ValueError(f"{func} is not compiled from its text, it can not be evaluated in other processes")
+        with self.lock:
+            if self.pool is None:
+                # spawned processes do not inherit threads and windows of the parent
+                self.pool = multiprocessing.get_context("spawn").Pool(self.workers)
+        count = slices + 1
+        size = max(EVALUATION_CHUNK, -(-count // (self.workers * PARALLEL_TASKS_PER_WORKER)))
+        memory = shared_memory.SharedMemory(create=True, size=count * 16)
+        data = None
+        try:
+            tasks = [(func.text, memory.name, start, end, slices, first, min(first + size, count))
+                for first in range(0, count, size)]
+            done = 0
+            # parts left after stop or error fail to find the unlinked block
+            for written in self.pool.imap_unordered(fill_shared, tasks):
+                done += written
+                if progress is not None and progress(done / count) is False:
+                    return None
+            data = np.ndarray((count, 2), buffer=memory.buf)
+        finally:
+            # the name is not needed any more, the mapping of a finished series lives on
+            memory.unlink()
+            if data is None:
+                memory.close()
+        # views of data keep it alive, and the block is unmapped only after the last of them
+        weakref.finalize(data, memory.close)
+        return SeriesBuffer.from_pairs(data)
+
+    @staticmethod
+    def accepts(func):
+        """
+        Whether processes of the pool evaluate the same function as func:
+        they compile it again from its text, like compile_function does
+        """
+        try:
+            return compile_function(func.text).func is func.func
+        except ValueError:
+            return False
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool = None
+
+
+class SeriesFileWriter:
+    """
+    Writes arg-value pairs to a file chunk by chunk, in format chosen by
+    extension of path: CSV with header, text table formatted like FTable,
+    raw little-endian float64 (x, y) pairs or NumPy .npy array of shape (count, 2)
+    """
+    ROW = "%7d %15.3f %15.3g\n"
+
+    def __init__(self, path, count):
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format not in EXPORT_FORMATS:
+            raise ValueError(f"unknown export format '{self.format}'")
+        self.file = open(path, "wb")
+        self.count = 0
+        if self.format == ".csv":
+            self.file.write(b"x,y\n")
+        elif self.format == ".txt":
+            self.file.write(b"%7s %15s %15s\n" % (b"#", b"x", b"f(x)"))
+        elif self.format == ".npy":
+            np.lib.format.write_array_header_1_0(self.file,
+                { "descr": "<f8", "fortran_order": False, "shape": (count, 2) })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def write(self, x, y):
+        """
+        Append pairs for arrays of args and values
+        """
+        pairs = np.column_stack((x, y)).astype("<f8", copy=False)
+        if self.format == ".csv":
+            self.file.write((("%r,%r\n" * len(pairs)) % tuple(pairs.ravel().tolist())).encode())
+        elif self.format == ".txt":
+            rows = np.column_stack((np.arange(self.count, self.count + len(pairs)), pairs)).tolist()
+            self.file.write(((self.ROW * len(rows)) % tuple(value for row in rows for value in row)).encode())
+        else:
+            self.file.write(pairs.tobytes())
+        self.count += len(pairs)
+
+    def close(self):
+        self.file.close()
+
+
+def export_series(path, chunks, count, progress=None, title=""):
+    """
+    Write arg-value pairs to a file chunk by chunk with SeriesFileWriter,
+    or with PdfTableWriter for .pdf path. Unfinished file is removed
+    @param chunks: iterable of (x, y) arrays, count pairs in total
+    @param progress: the same as for Function.sample
+    @param title: title of PDF table
+    @return: path, or nothing if stopped by progress delegate
+    """
+    if os.path.splitext(path)[1].lower() == ".pdf":
+        writer = PdfTableWriter(path, title)
+    else:
+        writer = SeriesFileWriter(path, count)
+    done = 0
+    try:
+        with writer:
+            for x, y in chunks:
+                writer.write(x, y)
+                done += len(x)
+                if progress is not None and progress(done / count) is False:
+                    break
+    finally:
+        if done < count:
+            os.remove(path)
+    return path if done == count else None
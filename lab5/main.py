@@ -1,47 +1,103 @@
 import math
+import numpy as np
+import threading
 import re
 import json 
-from weasyprint import HTML
+import os
+from core import (SeriesBuffer, SeriesCache, LazySeries, EXPORT_FORMATS, BUILTIN_FUNCTIONS,
+    compile_function, decimate, clip_polyline, export_series,
+    ParallelEvaluator, PARALLEL_MIN_SLICES, EVALUATION_CHUNK)
 import wx
-import wx.lib.dialogs as dialog
 
 DEFAULT_COLOR = "#fe0101"
 MIN_PLOT_SIZE = 10
 MULTIPLE_MAIN_WINDOWS = True
-
-class Function:
-    def __init__(self, func, text):
+PLOT_ZOOM_STEP = 1.25 # per mouse wheel notch
+PLOT_ZOOM_RANGE = (1e-6, 1e9) # pixels per unit
+PLOT_GRID_MIN_STEP = 10 # pixels
+PLOT_TILE_COLUMNS = 256 # args evaluated per tile, about one per pixel column
+PLOT_TILE_CACHE_BUDGET = 32 * 1024 * 1024 # bytes, for plots without a shared cache
+PLOT_COLORS = ["#0160c0", "#10a040", "#e08000", "#8030c0", "#00a0a0", "#c03080"] # for curves after the first
+
+class EvaluationWorker:
+    """
+    Evaluates functions on a background thread chunk by chunk.
+    Progress, results and errors are delivered to the wx main thread
+    with wx.CallAfter. Starting a new evaluation supersedes the one
+    in progress: it stops after its current chunk and its results
+    are never delivered
+    """
+    def __init__(self, onProgress, onError, evaluator=None):
         """
-        @param func: delegate of type (double) -> double
-        @param text: string
+        @param onProgress: delegate of type (double) -> None
+        @param onError: delegate of type (Exception) -> None
+        @param evaluator: optional ParallelEvaluator for large uniform series
         """
-        self.func = func
-        self.text = "f(x) = " + text
-        pass
+        self.onProgress = onProgress
+        self.onError = onError
+        self.evaluator = evaluator
+        self.generation = 0
 
-    def __repr__(self):
-        return self.text
-
-    def apply(self, arg):
-        return self.func(arg)
+    def Start(self, func, start, end, slices, onDone, adaptive=False):
+        """
+        Start evaluation of func on given interval
+        @param onDone: delegate of type (SeriesBuffer) -> None
+        @param adaptive: use Function.sample_adaptive with slices as budget of points
+        """
+        self.StartTask(lambda progress: self.Sample(func, start, end, slices, adaptive, progress), onDone)
 
-    def apply(self, start, end, slices):
+    def Sample(self, func, start, end, slices, adaptive, progress):
+        """
+        Evaluate func on the calling thread, large uniform series
+        are evaluated by the parallel evaluator if there is one, it has more
+        than one process and it accepts func.
+        MinMaxPyramid of the series is built here too, not on the main thread
+        @return: SeriesBuffer, or nothing if stopped by progress
+        """
+        # a pool of one process only adds the cost of its start and of shared memory
+        if (self.evaluator is not None and self.evaluator.workers > 1 and not adaptive
+                and slices >= PARALLEL_MIN_SLICES and self.evaluator.accepts(func)):
+            series = self.evaluator.apply(func, start, end, slices, progress)
+        else:
+            sample = func.sample_adaptive if adaptive else func.sample
+            result = sample(start, end, slices, progress)
+            series = None if result is None else SeriesBuffer(*result)
+        if series is not None:
+            series.build_pyramid()
+        return series
+
+    def StartTask(self, task, onDone):
         """
-        Apply this function to several arg values on given interval
-        and return list of arg-value pairs
+        Start any long task the same way as evaluation
+        @param task: delegate that receives progress delegate like Function.sample
+            and returns nothing if stopped by it
+        @param onDone: delegate that receives result of the task
         """
-        a = min(start, end)
-        b = max(start, end)
-        step = (b - a) / slices
-        result = []
-        for i in range(slices):
-            result.append([a, self.func(a)])
-            a += step
-        result.append([b, self.func(b)])
-        return result
+        self.generation += 1
+        thread = threading.Thread(target=self.Run, daemon=True,
+            args=(self.generation, task, onDone))
+        thread.start()
+
+    def Cancel(self):
+        self.generation += 1
+
+    def Run(self, generation, task, onDone):
+        def progress(fraction):
+            if generation != self.generation:
+                return False
+            wx.CallAfter(self.Deliver, generation, self.onProgress, fraction)
+        try:
+            result = task(progress)
+        except Exception as error:
+            wx.CallAfter(self.Deliver, generation, self.onError, error)
+            return
+        if result is not None:
+            wx.CallAfter(self.Deliver, generation, onDone, result)
 
-    def describe(self, arg):
-        return f"f({arg}) = {self.func(arg)}"
+    def Deliver(self, generation, callback, *args):
+        # results of superseded or cancelled evaluations are dropped here
+        if generation == self.generation:
+            callback(*args)
 
 
 class SinglePanelWindow(wx.Frame):
@@ -58,13 +114,22 @@ class SinglePanelWindow(wx.Frame):
 
 
 class FPlot(wx.Panel):
-    def __init__(self, parent): 
+    def __init__(self, parent, cache=None): 
+        """
+        @param cache: SeriesCache for tiles evaluated when zoomed in past density of series
+        """
         wx.Panel.__init__(self, parent, -1)
+        self.cache = cache if cache is not None else SeriesCache(PLOT_TILE_CACHE_BUDGET)
         self.counter = 0
-        self.zoom = 20
-        self.series = []
-        self.description = ""
-        self.color = DEFAULT_COLOR
+        self.zoom = 20 # pixels per unit
+        self.offset = (0, 0) # of origin in pixels, changed by dragging
+        self.drag = None # last mouse position while dragging
+        self.items = [] # (series, color, pyramid, function) of every curve, drawn on shared axes
+        self.bounds = (0, 0) # the smallest and the largest arg of all series
+        self.descriptions = []
+        self.background = None
+        self.curve = None
+        self.buffer = None
         self.plot = wx.Panel(self, -1)
         sizer = wx.GridBagSizer()
         sizer.SetRows(3)
@@ -82,95 +147,306 @@ class FPlot(wx.Panel):
         self.SetMinSize((600, 600))
         self.Layout()
         self.plot.SetBackgroundColour(wx.Colour(0xfbf8f5))
+        self.plot.SetBackgroundStyle(wx.BG_STYLE_PAINT)
         self.plot.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.plot.Bind(wx.EVT_SIZE, self.OnSize)
+        self.plot.Bind(wx.EVT_MOUSEWHEEL, self.OnMouseWheel)
+        self.plot.Bind(wx.EVT_LEFT_DOWN, self.OnLeftDown)
+        self.plot.Bind(wx.EVT_MOTION, self.OnMotion)
+        self.plot.Bind(wx.EVT_LEFT_UP, self.OnLeftUp)
+        self.plot.Bind(wx.EVT_MOUSE_CAPTURE_LOST, self.OnLeftUp)
+
+    def SetData(self, series, description="", func=None):
+        self.items = []
+        self.descriptions = []
+        self.AddSeries(series, DEFAULT_COLOR, description, func)
+
+    def AddSeries(self, series, color, description="", func=None):
+        """
+        Add one more curve on the same axes, bounds of the plot grow to fit it
+        @param func: Function of the series, evaluated again for visible args
+            when zoomed in past density of the series
+        """
+        if not re.match(r"^#[0-9a-fA-F]{6}$", color):
+            color = DEFAULT_COLOR
+        # only uniform series denser than pixels are replaced by tiles: adaptive
+        # ones would lose their gaps, and coarser ones are sampled so on purpose
+        if series.gaps is not None or len(series) < 2 or self.GetSpacing(series) > 1:
+            func = None
+        # evaluation threads build the pyramid in advance, so that
+        # adding a curve, zoom and pan do not walk all the points
+        self.items.append((series, color, series.build_pyramid(), func))
+        self.descriptions.append(description)
+        starts = [item[0][0][0] for item in self.items if len(item[0])]
+        ends = [item[0][-1][0] for item in self.items if len(item[0])]
+        self.bounds = (min(starts, default=0), max(ends, default=0))
+        self.text.SetLabel("\n".join(filter(None, self.descriptions)))
+        self.plot.SetInitialSize(wx.Size(*self.GetPlotSize()))
+        self.Invalidate()
+
+    def GetPlotSize(self):
+        """
+        Size of plot area that fits the whole interval of args at current zoom
+        """
+        width = int(max(abs(int(self.bounds[1]-self.bounds[0])), MIN_PLOT_SIZE) * self.zoom)
+        return (width, width)
+
+    def SetLineColor(self, color, index=0):
+        if re.match(r"^#[0-9a-fA-F]{6}$", color) and index < len(self.items):
+            series, _, pyramid, func = self.items[index]
+            self.items[index] = (series, color, pyramid, func)
+            self.buffer = None
+            self.plot.Refresh()
 
-    def SetData(self, series, description=""):
-        self.series = series
-        self.text.SetLabel(description)
-        width = max(abs(int(series[-1][0]-series[0][0])), MIN_PLOT_SIZE) * self.zoom
-        self.plot.SetInitialSize(wx.Size(width, width))
+    def OnSize(self, event):
+        self.Invalidate()
+        event.Skip()
+
+    def Invalidate(self):
+        """
+        Drop all cached layers, they are drawn again on next paint
+        """
+        self.background = None
+        self.curve = None
+        self.buffer = None
         self.plot.Refresh()
 
-    def SetLineColor(self, color):
-        if re.match(r"^#[0-9a-fA-F]{6}$", color):
-            self.color = color
-            self.plot.Refresh()
+    def OnMouseWheel(self, event):
+        """
+        Zoom in or out keeping the point under mouse in place
+        """
+        width, height = self.plot.GetSize()
+        mouse_x, mouse_y = event.GetPosition()
+        origin = self.GetOrigin(width, height)
+        x = (mouse_x - origin[0]) / self.zoom
+        y = (origin[1] - mouse_y) / self.zoom
+        factor = PLOT_ZOOM_STEP ** (event.GetWheelRotation() / event.GetWheelDelta())
+        self.zoom = min(max(self.zoom * factor, PLOT_ZOOM_RANGE[0]), PLOT_ZOOM_RANGE[1])
+        origin = self.GetOrigin(width, height)
+        self.offset = (self.offset[0] + mouse_x - x * self.zoom - origin[0],
+            self.offset[1] + mouse_y + y * self.zoom - origin[1])
+        self.Invalidate()
+
+    def OnLeftDown(self, event):
+        self.drag = event.GetPosition()
+        self.plot.CaptureMouse()
+
+    def OnMotion(self, event):
+        if self.drag is None or not event.Dragging():
+            return
+        position = event.GetPosition()
+        self.offset = (self.offset[0] + position[0] - self.drag[0], self.offset[1] + position[1] - self.drag[1])
+        self.drag = position
+        self.Invalidate()
 
-    def OnPaint(self, event):
+    def OnLeftUp(self, event):
+        if self.drag is not None and self.plot.HasCapture():
+            self.plot.ReleaseMouse()
+        self.drag = None
+
+    def GetOrigin(self, width, height):
         zoom = self.zoom
-        self.counter += 1
-        dc = wx.PaintDC(self.plot)
+        return (width // 2 - int(self.bounds[0]+self.bounds[1]) // 2 * zoom + self.offset[0],
+            height // 2 + self.offset[1])
 
-        if (len(self.series) < 2):
-            return
+    def DrawBackground(self, dc, width, height):
+        """
+        Draw grid and coordinate axes
+        """
+        origin = self.GetOrigin(width, height)
+        dc.SetBackground(wx.Brush(self.plot.GetBackgroundColour()))
+        dc.Clear()
+
+        # grid step is a power of 10 units, so that lines are not too dense or too sparse
+        unit = 10.0 ** math.ceil(math.log10(PLOT_GRID_MIN_STEP / self.zoom))
+        step = unit * self.zoom
+        tick = int(min(step, 20))
 
-        shifted = self.series[1::]
-        shifted.append(shifted[-1])
+        # draw grid
+        dc.SetPen(wx.Pen("#e8e9ef"))
+        for i in range(math.floor(-origin[0] / step), math.ceil((width - origin[0]) / step) + 1):
+            x = int(round(origin[0] + i * step))
+            dc.DrawLine(x, 0, x, height)
+        for i in range(math.floor(-origin[1] / step), math.ceil((height - origin[1]) / step) + 1):
+            y = int(round(origin[1] + i * step))
+            dc.DrawLine(0, y, width, y)
+
+        # draw coordinate axes, only those in view: when zoomed in far from
+        # the origin its coordinates do not even fit in int that dc takes
+        dc.SetPen(wx.Pen("#494949"))
+        x_axis = 0 <= origin[1] <= height
+        y_axis = 0 <= origin[0] <= width
+        ox = int(round(origin[0])) if y_axis else None
+        oy = int(round(origin[1])) if x_axis else None
+        if y_axis:
+            dc.DrawLine(ox, 0, ox, height)
+            dc.DrawText("y", ox-10, 1)
+        if x_axis:
+            dc.DrawLine(0, oy, width, oy)
+            dc.DrawText("x", width-12, oy+tick//5)
+        if x_axis and y_axis:
+            dc.DrawText("0", ox-10, oy+tick//6)
+            if ox + step <= width:
+                dc.DrawLine(int(ox+step), oy-tick//5, int(ox+step), oy+tick//5)
+                dc.DrawText(f"{unit:g}", int(ox+step)-4, oy+tick//5)
+
+    def GetCurve(self, item, width, height):
+        """
+        Compute polyline runs of function graph in pixel coordinates
+        """
+        series, color, pyramid, func = item
+        zoom = self.zoom
+        origin = self.GetOrigin(width, height)
+        start, end = -origin[0] / zoom, (width - origin[0]) / zoom
+        if func is not None and self.GetSpacing(series) > 1:
+            tiles = self.GetTiles(func, start, end, series.x[0], series.x[-1])
+            if tiles is not None:
+                px = origin[0] + tiles[0]*zoom
+                py = origin[1] - tiles[1]*zoom
+                return clip_polyline(px, py, width, height)
+        # only visible points are taken, from the pyramid level with about a block per column
+        visible = pyramid.query(start, end, width)
+        px = origin[0] + series.x[visible]*zoom
+        py = origin[1] - series.y[visible]*zoom
+        kept = decimate(px, py, width)
+        breaks = None
+        if pyramid.spanned is not None:
+            # a segment between kept points is broken if it spans any gap
+            kept_points = visible[kept]
+            breaks = pyramid.spanned[kept_points[1:]] > pyramid.spanned[kept_points[:-1]]
+        return clip_polyline(px[kept], py[kept], width, height, breaks)
+
+    def GetSpacing(self, series):
+        """
+        Distance between neighbouring args of a uniform series in pixels
+        """
+        return (series.x[-1] - series.x[0]) / (len(series) - 1) * self.zoom
 
-        x_start = int(self.series[0][0]-MIN_PLOT_SIZE)
+    def GetTiles(self, func, start, end, lower, upper):
+        """
+        Evaluate func for visible args at screen resolution. Args are split
+        into tiles aligned to a grid of power of two widths, which are kept
+        in the cache, so panning evaluates only tiles that come into view
+        @param start, end: visible interval of args
+        @param lower, upper: interval of args of the series
+        @return: arrays of args and values, or nothing if func can not be evaluated there
+        """
+        start, end = max(start, lower), min(end, upper)
+        if end <= start:
+            return None
+        span = 2.0 ** round(math.log2(PLOT_TILE_COLUMNS / self.zoom))
+        try:
+            tiles = [self.cache.fetch(func, tile * span, (tile + 1) * span, PLOT_TILE_COLUMNS)
+                for tile in range(math.floor(start / span), math.floor(end / span) + 1)]
+        except (ArithmeticError, ValueError):
+            return None
+        x = np.concatenate([tile.x for tile in tiles])
+        y = np.concatenate([tile.y for tile in tiles])
+        inside = (x >= lower) & (x <= upper)
+        return x[inside], y[inside]
+
+    def GetCurves(self, width, height):
+        return [self.GetCurve(item, width, height) for item in self.items if len(item[0]) > 1]
+
+    def DrawCurve(self, dc):
+        colors = [color for series, color, pyramid, func in self.items if len(series) > 1]
+        for runs, color in zip(self.curve, colors):
+            dc.SetPen(wx.Pen(color))
+            for run in runs:
+                dc.DrawLines(run)
 
+    def OnPaint(self, event):
+        self.counter += 1
+        dc = wx.PaintDC(self.plot)
         width, height = self.plot.GetSize()
-        origin = (width // 2 - int(self.series[0][0]+self.series[-1][0]) // 2 * zoom, height // 2)
+        self.Render(dc, width, height)
 
-        # draw grid
-        dc.SetPen(wx.Pen("#e8e9ef"))
-        for i in range(origin[0]+x_start*zoom, width, zoom):
-            dc.DrawLine(i, 0, i, height)
-        for i in range(zoom, height // 2, zoom):
-            dc.DrawLine(0, origin[1] + i, width, origin[1] + i)
-            dc.DrawLine(0, origin[1] - i, width, origin[1] - i)
+    def Render(self, dc, width, height):
+        """
+        Draw the plot of given size on any dc, reusing cached layers
+        """
+        if (not self.items or width < 1 or height < 1):
+            dc.SetBackground(wx.Brush(self.plot.GetBackgroundColour()))
+            dc.Clear()
+            return
 
-        # draw coordinate axes
-        dc.SetPen(wx.Pen("#494949"))
-        dc.DrawLine(origin[0], 0, origin[0], height)
-        dc.DrawLine(0, origin[1], width, origin[1])
-        dc.DrawLine(origin[0]+zoom, origin[1]-zoom//5, origin[0]+zoom, origin[1]+zoom//5)
-        dc.DrawText("0", origin[0]-10, origin[1]+zoom//6)
-        dc.DrawText("1", origin[0]+zoom-4, origin[1]+zoom//5)
-        dc.DrawText("x", width-12, origin[1]+zoom//5)
-        dc.DrawText("y", origin[0]-10, 1)
-
-        val_max = height 
-        arg_max = width
-        # draw function graph
-        dc.SetPen(wx.Pen(self.color))
-        for p1, p2 in zip(self.series, shifted):
-            x1 = origin[0] + p1[0]*zoom
-            y1 = origin[1] - p1[1]*zoom
-            x2 = origin[0] + p2[0]*zoom
-            y2 = origin[1] - p2[1]*zoom
-            if x1 < arg_max and x1 > 0 and y1 < val_max and y1 > 0 \
-                or x2 < arg_max and x2 > 0 and y2 < val_max and y2 > 0:
-                dc.DrawLine(int(x1), int(y1), int(x2), int(y2))
-
-
-class FTable(wx.TextCtrl):
+        # grid and axes are redrawn only after resize or data change,
+        # the curves are recomputed only after that too,
+        # and on color change the picture is put together from them again
+        if self.background is None:
+            self.background = wx.Bitmap(width, height)
+            layer = wx.MemoryDC(self.background)
+            self.DrawBackground(layer, width, height)
+            layer.SelectObject(wx.NullBitmap)
+        if self.curve is None:
+            self.curve = self.GetCurves(width, height)
+        if self.buffer is None:
+            self.buffer = wx.Bitmap(width, height)
+            layer = wx.MemoryDC(self.buffer)
+            layer.DrawBitmap(self.background, 0, 0)
+            self.DrawCurve(layer)
+            layer.SelectObject(wx.NullBitmap)
+        dc.DrawBitmap(self.buffer, 0, 0)
+
+    def RenderVector(self, dc, width, height):
+        """
+        Draw the plot of given size without cached bitmap layers,
+        for dcs that keep vector shapes, e.g. wx.SVGFileDC
+        """
+        if not self.items:
+            return
+        self.DrawBackground(dc, width, height)
+        self.curve = self.GetCurves(width, height)
+        self.DrawCurve(dc)
+        # cached layers may be of another size now
+        self.Invalidate()
+
+
+class FTable(wx.ListCtrl):
+    """
+    Virtual table of arg-value pairs. Rows are not stored in the widget,
+    they are formatted on demand when they become visible
+    """
     def __init__(self, parent):
-        wx.TextCtrl.__init__(self, parent, -1, style=(wx.TE_MULTILINE | wx.TE_READONLY))
+        wx.ListCtrl.__init__(self, parent, -1, style=(wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_HRULES))
         self.SetFont(wx.Font(10, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
-        self.SetCanFocus(False)
-        self.SetMinSize((250, 400))
+        self.InsertColumn(0, "#", wx.LIST_FORMAT_RIGHT, width=80)
+        self.InsertColumn(1, "x", wx.LIST_FORMAT_RIGHT, width=120)
+        self.InsertColumn(2, "f(x)", wx.LIST_FORMAT_RIGHT, width=120)
+        self.series = []
+        self.SetMinSize((330, 400))
         self.Layout()
 
     def SetData(self, series):
-        cnt = 0
-        self.SetValue("  #             x               f(x)\n")
-        for x, y in series:
-            self.AppendText(f"{cnt:>4}  {x:>14.3f}  {y:>15.3g}\n")
-            cnt += 1
+        self.series = series
+        self.SetItemCount(len(series))
+        self.Refresh()
+
+    def OnGetItemText(self, item, column):
+        if column == 0:
+            return str(item)
+        try:
+            x, y = self.series[item]
+        except (ArithmeticError, ValueError):
+            # lazy series evaluate rows on demand, and some of them may fail
+            return "помилка"
+        return f"{x:.3f}" if column == 1 else f"{y:.3g}"
 
 
 class FunctionView(wx.Panel):
-    def __init__(self, parent, functions, onTableButton, onPlotButton):
+    def __init__(self, parent, functions, onTableButton, onPlotButton, cache=None, evaluator=None):
         """
         @param parent: parent widget
-        @param functions: function collection to show
+        @param functions: function collection to show, copied, so that functions
+            added in this view do not shift choices of other views
+        @param cache: SeriesCache shared with other views
+        @param evaluator: ParallelEvaluator shared with other views
         """
         wx.Panel.__init__(self, parent, -1)
         # to create a panel and fill it with function descriptions
         panel = wx.Panel(self)
         sizer = wx.GridBagSizer(4, 12)
-        rows, cols = 7, 3
+        rows, cols = 9, 3
         sizer.SetRows(rows)
         sizer.SetCols(cols)
         for i in range(rows): sizer.AddGrowableRow(i, 1)
@@ -200,16 +476,33 @@ class FunctionView(wx.Panel):
         color_hex_input = wx.TextCtrl(panel, -1, style=wx.TE_CENTER)
         color_hex_input.SetValue(DEFAULT_COLOR)
         sizer.Add(color_hex_input, wx.GBPosition(4, 2), flag= wx.EXPAND | wx.ALIGN_CENTER_VERTICAL)
+        # custom function input
+        f_text_input = wx.TextCtrl(panel, -1)
+        f_text_input.SetHint("Своя функція, напр. x^2 - 3sin(x)")
+        sizer.Add(f_text_input, wx.GBPosition(5, 0), wx.GBSpan(1, 2), flag=wx.EXPAND | wx.ALIGN_CENTER_VERTICAL)
+        f_add_button = wx.Button(panel, -1, "Додати")
+        f_add_button.SetCanFocus(False)
+        sizer.Add(f_add_button, wx.GBPosition(5, 2), flag=wx.EXPAND)
         # submit buttons
+        # sampling mode
+        adaptive_input = wx.CheckBox(panel, -1, "Адаптивна дискретизація (к-ть відрізків як межа точок)")
+        sizer.Add(adaptive_input, wx.GBPosition(6, 0), wx.GBSpan(1, 3), flag=wx.EXPAND | wx.ALIGN_CENTER_VERTICAL)
         plot_button = wx.Button(panel, -1, "Графік")
         plot_button.SetCanFocus(False)
-        sizer.Add(plot_button, wx.GBPosition(6, 0), flag=wx.EXPAND)
+        sizer.Add(plot_button, wx.GBPosition(7, 0), flag=wx.EXPAND)
         table_button = wx.Button(panel, -1, "Таблиця")
         table_button.SetCanFocus(False)
-        sizer.Add(table_button, wx.GBPosition(6, 1), flag=wx.EXPAND)
+        sizer.Add(table_button, wx.GBPosition(7, 1), flag=wx.EXPAND)
         pdf_button = wx.Button(panel, -1, ">> PDF")
         pdf_button.SetCanFocus(False)
-        sizer.Add(pdf_button, wx.GBPosition(6, 2), flag=wx.EXPAND)
+        sizer.Add(pdf_button, wx.GBPosition(7, 2), flag=wx.EXPAND)
+        # evaluation progress
+        progress = wx.Gauge(panel, -1, range=1000)
+        sizer.Add(progress, wx.GBPosition(8, 0), wx.GBSpan(1, 2), flag=wx.EXPAND | wx.ALIGN_CENTER_VERTICAL)
+        cancel_button = wx.Button(panel, -1, "Скасувати")
+        cancel_button.SetCanFocus(False)
+        cancel_button.Disable()
+        sizer.Add(cancel_button, wx.GBPosition(8, 2), flag=wx.EXPAND)
         # finish panel layout
         panel.SetSizer(sizer)
         panel.Layout()
@@ -222,7 +515,8 @@ class FunctionView(wx.Panel):
         self.SetMinSize(wx.Size(480, 480))
         self.Layout()
         # back up some variables
-        self.functions = functions
+        self.functions = list(functions)
+        self.cache = cache if cache is not None else SeriesCache()
         self.f_choice = f_choice
         self.start_input = start_input
         self.end_input = end_input
@@ -230,19 +524,39 @@ class FunctionView(wx.Panel):
         self.table_button = table_button
         self.plot_button = plot_button
         self.color_hex_input = color_hex_input
+        self.adaptive_input = adaptive_input
+        self.progress = progress
+        self.cancel_button = cancel_button
+        self.worker = EvaluationWorker(self.OnProgress, self.OnEvaluationError, evaluator)
+        self.f_text_input = f_text_input
         # bind event handlers
-        table_button.Bind(wx.EVT_BUTTON, lambda event: onTableButton(self.OnSubmit()))
-        plot_button.Bind(wx.EVT_BUTTON, lambda event: onPlotButton(self.OnSubmit()))
+        f_add_button.Bind(wx.EVT_BUTTON, lambda event: self.OnAddFunction())
+        table_button.Bind(wx.EVT_BUTTON, lambda event: self.OnTable(onTableButton))
+        plot_button.Bind(wx.EVT_BUTTON, lambda event: self.OnSubmit(onPlotButton))
+        cancel_button.Bind(wx.EVT_BUTTON, lambda event: self.OnCancel())
         pdf_button.Bind(wx.EVT_BUTTON, lambda event: self.ToPdf())
         pass
 
-    def OnSubmit(self):
+    def GetParameters(self):
+        """
+        Read and check inputs
+        @return: (func, start, end, slices, adaptive, color) or nothing if inputs are wrong
+        """
         # get choice index and do some safety checks
         f_choice_index = self.f_choice.GetSelection()
-        color = self.color_hex_input.GetValue()
         if f_choice_index == wx.NOT_FOUND:
             self.Error("Для початку оберіть функцію з переліку.")
-            return ([], "", color)
+            return None
+        interval = self.GetInterval()
+        if interval is None:
+            return None
+        func = self.functions[f_choice_index]
+        return (func, *interval, self.adaptive_input.GetValue(), self.color_hex_input.GetValue())
+
+    def GetInterval(self):
+        """
+        @return: (start, end, slices) or nothing if inputs are wrong
+        """
         # get argument value and do some safety checks
         try:
             start = float(self.start_input.GetValue())
@@ -250,15 +564,161 @@ class FunctionView(wx.Panel):
             slices = int(self.slices_input.GetValue())
         except ValueError:
             self.Error("Не вдалося перетворити введені параметри в число. Спробуйте з іншими значеннями.")
-            return ([], "", color)
-        # apply function to argument and describe it all in output field
+            return None
+        return (start, end, slices)
+
+    def OnSubmit(self, onDone):
+        """
+        Evaluate selected function in background
+        @param onDone: delegate that receives (series, description, color, function)
+        """
+        parameters = self.GetParameters()
+        if parameters is None:
+            return
+        # take series from cache or apply function to argument in background
+        func, start, end, slices, adaptive, color = parameters
+        key = self.SeriesKey(func, start, end, slices, adaptive)
+        series = self.cache.get(key)
+        if series is not None:
+            self.worker.Cancel()
+            self.StopProgress()
+            onDone((series, str(func), color, func))
+            return
+        def done(series):
+            self.cache.put(key, series)
+            self.StopProgress()
+            onDone((series, str(func), color, func))
+        self.progress.SetValue(0)
+        self.cancel_button.Enable()
+        self.worker.Start(func, start, end, slices, done, adaptive)
+
+    def OnSubmitAll(self, onDone):
+        """
+        Evaluate all functions on the same interval in background
+        @param onDone: delegate that receives list of (series, description, color, function),
+            the first one has color from input, others take colors from PLOT_COLORS.
+            Functions that fail to evaluate are reported and left out
+        """
+        interval = self.GetInterval()
+        if interval is None:
+            return
+        start, end, slices = interval
+        adaptive = self.adaptive_input.GetValue()
+        colors = [self.color_hex_input.GetValue()] + PLOT_COLORS
+        funcs = list(self.functions)
+        keys = [self.SeriesKey(func, start, end, slices, adaptive) for func in funcs]
+        found = [self.cache.get(key) for key in keys]
+        missing = [i for i, series in enumerate(found) if series is None]
+        failed = []
+        def task(progress):
+            # progress of every function takes its share of the whole
+            for n, i in enumerate(missing):
+                try:
+                    found[i] = self.worker.Sample(funcs[i], start, end, slices, adaptive,
+                        lambda fraction: progress((n + fraction) / len(missing)))
+                except (ArithmeticError, ValueError):
+                    # one function that can not be evaluated here does not spoil the others
+                    failed.append(i)
+                    continue
+                if found[i] is None:
+                    return None
+            return found
+        def done(found):
+            for i in missing:
+                if i not in failed:
+                    self.cache.put(keys[i], found[i])
+            self.StopProgress()
+            if failed:
+                self.Error("Не вдалося обчислити значення функцій: " + ", ".join(str(funcs[i]) for i in failed))
+            if len(failed) < len(funcs):
+                onDone([(series, str(func), colors[i % len(colors)], func)
+                    for i, (series, func) in enumerate(zip(found, funcs)) if i not in failed])
+        self.progress.SetValue(0)
+        self.cancel_button.Enable()
+        self.worker.StartTask(task, done)
+
+    @staticmethod
+    def SeriesKey(func, start, end, slices, adaptive):
+        """
+        @return: key of the series in SeriesCache, the same as SeriesCache.fetch uses
+        """
+        return (func, min(start, end), max(start, end), slices, adaptive)
+
+    def OnTable(self, onDone):
+        """
+        Show selected function in a table. Uniform series that are not in
+        the cache are not evaluated in advance, the table evaluates
+        visible chunks on demand
+        @param onDone: delegate that receives (series, description, color, function)
+        """
+        parameters = self.GetParameters()
+        if parameters is None:
+            return
+        func, start, end, slices, adaptive, color = parameters
+        if adaptive:
+            self.OnSubmit(onDone)
+            return
+        series = self.cache.get(self.SeriesKey(func, start, end, slices, adaptive))
+        if series is not None:
+            onDone((series, str(func), color, func))
+            return
+        if slices < 1:
+            self.OnEvaluationError(ValueError("slices must be positive"))
+            return
+        series = LazySeries(func, start, end, slices)
         try:
-            func = self.functions[f_choice_index]
-            series = func.apply(start, end, slices)
-        except:
-            self.Error("При обчисленні значень функції виникла помилка. Спробуйте задати інші значення.")
-            return ([], "", color)
-        return (series, str(func), color)
+            # the first chunk is shown right away, so errors in it are reported here
+            series[0]
+        except (ArithmeticError, ValueError) as error:
+            self.OnEvaluationError(error)
+            return
+        onDone((series, str(func), color, func))
+
+    def OnCancel(self):
+        self.worker.Cancel()
+        self.StopProgress()
+
+    def OnProgress(self, fraction):
+        self.progress.SetValue(int(fraction * self.progress.GetRange()))
+
+    def OnEvaluationError(self, error):
+        self.StopProgress()
+        self.Error("При обчисленні значень функції виникла помилка. Спробуйте задати інші значення.")
+
+    def StopProgress(self):
+        self.progress.SetValue(0)
+        self.cancel_button.Disable()
+
+    def OnAddFunction(self):
+        text = self.f_text_input.GetValue().strip()
+        if not text:
+            return
+        try:
+            func = compile_function(text)
+        except ValueError as error:
+            self.Error(f"Не вдалося розібрати функцію: {error}.")
+            return
+        self.functions.append(func)
+        self.f_choice.Append(str(func))
+        self.f_choice.SetSelection(len(self.functions) - 1)
+        self.f_text_input.SetValue("")
+
+    def SelectFunction(self, data):
+        """
+        Select function saved by ToFile, by its text if it was saved,
+        adding it to this view if it is not there yet
+        """
+        text = data.get("function")
+        if not text:
+            self.f_choice.SetSelection(data["choice_index"])
+            return
+        func = compile_function(text)
+        texts = [str(f) for f in self.functions]
+        if str(func) not in texts:
+            self.functions.append(func)
+            self.f_choice.Append(str(func))
+            texts.append(str(func))
+        self.f_choice.SetSelection(texts.index(str(func)))
 
     def Error(self, message):
         print(message)
@@ -266,11 +726,12 @@ class FunctionView(wx.Panel):
 
     def FromFile(self):
         try:
+            import wx.lib.dialogs as dialog
             filePath = dialog.openFileDialog().paths[0]
             f = open(filePath, "r")
             data = json.loads(f.read())
             f.close()
-            self.f_choice.SetSelection(data["choice_index"])
+            self.SelectFunction(data)
             self.start_input.SetValue(data["start"])
             self.end_input.SetValue(data["end"])
             self.slices_input.SetValue(data["slices"])
@@ -280,10 +741,12 @@ class FunctionView(wx.Panel):
 
     def ToFile(self):
         try:
+            import wx.lib.dialogs as dialog
             filePath = dialog.saveFileDialog(wildcard="JSON format (*.json)|*.json").paths[0]
             f = open(filePath, "w+")
             data = ({
                 "choice_index": self.f_choice.GetSelection(),
+                "function": self.f_choice.GetStringSelection(),
                 "start": self.start_input.GetValue(),
                 "end": self.end_input.GetValue(),
                 "slices": self.slices_input.GetValue(),
@@ -294,12 +757,58 @@ class FunctionView(wx.Panel):
         except:
             print("[FunctionView.ToFile]: unknown error occured")
 
-    def ToPdf(self):
+    def ToPdf(self, pretty=False):
+        """
+        @param pretty: lay the table out with WeasyPrint, which is much slower
+        """
+        import wx.lib.dialogs as dialog
         dialogResult = dialog.saveFileDialog(wildcard="Portable document (*.pdf)|*.pdf")
         if dialogResult.paths is None: return
         filePath = dialogResult.paths[0]
+        if pretty:
+            self.OnSubmit(lambda data: self.WritePrettyPdf(filePath, data))
+        else:
+            self.Export(filePath)
+
+    def ToDataFile(self):
+        wildcard = "|".join(f"{name} (*{ext})|*{ext}" for ext, name in EXPORT_FORMATS.items())
+        import wx.lib.dialogs as dialog
+        dialogResult = dialog.saveFileDialog(wildcard=wildcard)
+        if dialogResult.paths is None: return
+        filePath = dialogResult.paths[0]
+        if os.path.splitext(filePath)[1].lower() not in EXPORT_FORMATS:
+            self.Error("Оберіть файл з розширенням " + ", ".join(EXPORT_FORMATS) + ".")
+            return
+        self.Export(filePath)
 
-        series, description, color = self.OnSubmit()
+    def Export(self, filePath):
+        """
+        Write selected function to a file in background, from the series
+        in the cache if there is one, or else evaluating it chunk by chunk
+        """
+        parameters = self.GetParameters()
+        if parameters is None:
+            return
+        func, start, end, slices, adaptive, color = parameters
+        if adaptive:
+            # adaptive series are no larger than their budget, write them as they are
+            self.OnSubmit(lambda data: export_series(filePath,
+                [(data[0].x, data[0].y)], len(data[0]), title=data[1]))
+            return
+        series = self.cache.get(self.SeriesKey(func, start, end, slices, adaptive))
+        if series is not None:
+            chunks = ((series.x[i:i + EVALUATION_CHUNK], series.y[i:i + EVALUATION_CHUNK])
+                for i in range(0, len(series), EVALUATION_CHUNK))
+        else:
+            chunks = func.chunks(start, end, slices)
+        self.progress.SetValue(0)
+        self.cancel_button.Enable()
+        self.worker.StartTask(
+            lambda progress: export_series(filePath, chunks, slices + 1, progress, str(func)),
+            lambda path: self.StopProgress())
+
+    def WritePrettyPdf(self, filePath, data):
+        series, description, color, func = data
 
         def oneTableRow(_tuple): 
             row, data = _tuple
@@ -330,26 +839,16 @@ class FunctionView(wx.Panel):
         </body>
         </html>
         """
+        from weasyprint import HTML # heavy and rarely needed, so it is loaded on first use
         HTML(string=htmlString, base_url="").write_pdf(filePath)
 
 
 class FuctionViewerApp(wx.App):
     def OnInit(self):
         # Functions are created here
-        self.functions = [
-            Function (
-                lambda x: math.pow(10, 1+x*x) - math.pow(10, 1-x*x), 
-                "10^(1+x^2) - 10^(1-x^2)"
-            ),
-            Function (
-                lambda x: math.tan(3*x-156) + math.tan(x) - 4*math.sin(x), 
-                "tg(3x-156) + tg(x) - 4sin(x)"
-            ),
-            Function (
-                lambda x: math.sin(x) + math.exp(x/9),
-                "sin(x) + exp(x/9)"
-            )
-        ]
+        self.functions = [compile_function(text) for text in BUILTIN_FUNCTIONS]
+        self.seriesCache = SeriesCache()
+        self.evaluator = ParallelEvaluator()
         self.plotCount = 0
         self.tableCount = 0
         self.mainWindowCount = 0
@@ -360,7 +859,8 @@ class FuctionViewerApp(wx.App):
         frame0 = SinglePanelWindow(None)
         frame0.SetTitle("Функція")
         frame0.Bind(wx.EVT_CLOSE, self.OnFunctionViewClosed)
-        fselect = FunctionView(frame0, self.functions, self.AddTable, self.AddPlot)
+        fselect = FunctionView(frame0, self.functions, self.AddTable, self.AddPlot,
+            self.seriesCache, self.evaluator)
         frame0.SetContent(fselect)
         frame0.Show()
         menubar = wx.MenuBar()
@@ -372,13 +872,19 @@ class FuctionViewerApp(wx.App):
         menubar.Bind(wx.EVT_MENU, lambda _: fselect.FromFile(), openItem)
         saveItem = windowMenu.Append(wx.ID_SAVE, "Зберегти", "Зберегти параметри в файл")
         menubar.Bind(wx.EVT_MENU, lambda _: fselect.ToFile(), saveItem)
+        exportItem = windowMenu.Append(wx.ID_ANY, "Експорт даних", "Зберегти значення функції в CSV, float64 або .npy")
+        menubar.Bind(wx.EVT_MENU, lambda _: fselect.ToDataFile(), exportItem)
+        plotAllItem = windowMenu.Append(wx.ID_ANY, "Графік усіх функцій", "Побудувати всі функції на спільних осях")
+        menubar.Bind(wx.EVT_MENU, lambda _: fselect.OnSubmitAll(self.AddPlots), plotAllItem)
+        prettyPdfItem = windowMenu.Append(wx.ID_ANY, "Гарний PDF", "Зберегти таблицю в PDF через WeasyPrint (повільно)")
+        menubar.Bind(wx.EVT_MENU, lambda _: fselect.ToPdf(pretty=True), prettyPdfItem)
         menubar.Append(windowMenu, "Меню")
         frame0.SetMenuBar(menubar)
         self.mainWindowCount += 1
 
     def AddTable(self, data):
         self.tableCount += 1
-        series, description, color = data
+        series, description, color, func = data
         frame1 = SinglePanelWindow(None)
         frame1.SetTitle(f"Таблиця {self.tableCount}")
         ftable = FTable(frame1)
@@ -387,16 +893,26 @@ class FuctionViewerApp(wx.App):
         frame1.Show()
 
     def AddPlot(self, data):
+        self.AddPlots([data])
+
+    def AddPlots(self, items):
+        """
+        Show several series in one plot on shared axes
+        @param items: list of (series, description, color, function)
+        """
         self.plotCount += 1
-        series, description, color = data
         frame2 = SinglePanelWindow(None)
         frame2.SetTitle(f"Графік {self.plotCount}")
-        fplot = FPlot(frame2)
-        fplot.SetData(series, description)
-        fplot.SetLineColor(color)
+        fplot = FPlot(frame2, self.seriesCache)
+        for series, description, color, func in items:
+            fplot.AddSeries(series, color, description, func)
         frame2.SetContent(fplot)
         frame2.Show()
 
+    def OnExit(self):
+        self.evaluator.close()
+        return 0
+
     def OnFunctionViewClosed(self, event):
         self.mainWindowCount -= 1
         if self.mainWindowCount == 0:
@@ -0,0 +1,113 @@
+"""
+Draw plots for lab5 parameter files into image files, without opening
+windows. Usage:
+
+    xvfb-run python render.py params.json [more.json ...] [-f png] [-o out] [-j 4]
+
+Parameter files are the same as for batch.py, an optional "adaptive" key
+makes the function sampled with Function.sample_adaptive. Plots are drawn
+by FPlot of a hidden window, wx still needs a display, hence xvfb-run
+on servers. Every process of the pool keeps its own wx.App and FPlot.
+Jobs that fail are reported and skipped, and the exit status is 1
+if any of them failed
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+from batch import job_function, read_jobs, report
+from core import SeriesBuffer
+
+IMAGE_FORMATS = ["png", "svg"]
+IMAGE_MAX_SIZE = 4000 # pixels per side, a plot that fits a wide interval is cut to it
+
+# wx.App and FPlot of current process, created by start_renderer
+renderer = None
+
+
+def start_renderer():
+    global renderer
+    import wx
+    import main
+    app = wx.App(False)
+    frame = wx.Frame(None)
+    renderer = (app, main.FPlot(frame))
+
+
+def render_job(job):
+    """
+    Evaluate function for one parameter object and draw its plot to a file
+    @param job: (parameters, output path, size or nothing for size that fits the interval)
+    @return: (output path, nothing) or (output path, error message) if the job failed
+    """
+    import wx
+    if renderer is None:
+        start_renderer()
+    data, path, size = job
+    try:
+        func = job_function(data)
+        start = float(data["start"])
+        end = float(data["end"])
+        slices = int(data["slices"])
+        sample = func.sample_adaptive if data.get("adaptive") else func.sample
+        plot = renderer[1]
+        plot.SetData(SeriesBuffer(*sample(start, end, slices)), str(func))
+        plot.SetLineColor(data.get("color", ""))
+        width, height = size or [min(side, IMAGE_MAX_SIZE) for side in plot.GetPlotSize()]
+        if path.endswith(".svg"):
+            dc = wx.SVGFileDC(path, width, height)
+            plot.RenderVector(dc, width, height)
+            dc.Destroy()
+        else:
+            bitmap = wx.Bitmap(width, height)
+            dc = wx.MemoryDC(bitmap)
+            plot.Render(dc, width, height)
+            dc.SelectObject(wx.NullBitmap)
+            bitmap.SaveFile(path, wx.BITMAP_TYPE_PNG)
+    except Exception as error:
+        # one bad job must not stop the others
+        if os.path.exists(path):
+            os.remove(path)
+        return path, f"{type(error).__name__}: {error}"
+    return path, None
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return (int(width), int(height))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Draw plots for lab5 parameter files into images")
+    parser.add_argument("files", nargs="+", help="JSON parameter files")
+    parser.add_argument("-f", "--format", choices=IMAGE_FORMATS, default="png", help="image format")
+    parser.add_argument("-o", "--output", default=".", help="output directory")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="count of parallel processes")
+    parser.add_argument("-s", "--size", type=parse_size,
+        help=f"image size like 800x600, fits the interval by default, up to {IMAGE_MAX_SIZE} pixels per side")
+    args = parser.parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    jobs = []
+    failed = 0
+    for path in args.files:
+        try:
+            for name, data in read_jobs(path):
+                jobs.append((data, os.path.join(args.output, f"{name}.{args.format}"), args.size))
+        except (OSError, ValueError) as error:
+            print(f"{path}: {type(error).__name__}: {error}", file=sys.stderr)
+            failed += 1
+    if args.jobs > 1 and len(jobs) > 1:
+        with multiprocessing.Pool(min(args.jobs, len(jobs)), initializer=start_renderer) as pool:
+            # plots are small jobs, so they are handed out in batches
+            chunksize = max(1, len(jobs) // (4 * args.jobs))
+            failed += report(pool.imap(render_job, jobs, chunksize))
+    else:
+        failed += report(map(render_job, jobs))
+    if failed:
+        print(f"{failed} failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Checks of the wx-free part of lab5. Run from lab5 directory:
+
+    python -m pytest test_core.py
+"""
+import math
+import unittest
+import numpy as np
+from core import (ExpressionParser, Function, MinMaxPyramid, ParallelEvaluator, SeriesBuffer,
+    clip_polyline, compile_expression, compile_function)
+
+
+class ExpressionTest(unittest.TestCase):
+    def value(self, text, x):
+        func, vfunc = compile_expression(text)
+        return func(x)
+
+    def test_implicit_multiplication(self):
+        self.assertEqual(self.value("3x", 2.0), 6.0)
+        self.assertEqual(self.value("2(x+1)", 2.0), 6.0)
+        self.assertEqual(self.value("x(x+1)", 2.0), 6.0)
+        self.assertEqual(self.value("(x+1)(x-1)", 2.0), 3.0)
+        self.assertAlmostEqual(self.value("4sin(x)", 2.0), 4 * math.sin(2.0))
+        self.assertAlmostEqual(self.value("2pi x", 2.0), 4 * math.pi)
+
+    def test_power(self):
+        # ^ is right associative and binds tighter than unary minus and implicit multiplication
+        self.assertEqual(self.value("2^3^2", 0.0), 512.0)
+        self.assertEqual(self.value("-2^2", 0.0), -4.0)
+        self.assertEqual(self.value("2^-1", 0.0), 0.5)
+        self.assertEqual(self.value("3x^2", 2.0), 12.0)
+        self.assertEqual(self.value("x**2", 3.0), 9.0)
+
+    def test_ctg(self):
+        self.assertAlmostEqual(self.value("ctg(x)", 2.0), 1 / math.tan(2.0))
+        self.assertAlmostEqual(self.value("ctg(2x)", 0.5), 1 / math.tan(1.0))
+
+    def test_folding(self):
+        self.assertEqual(ExpressionParser("2^3^2 + 1").parse(), ("num", 513.0))
+        self.assertEqual(ExpressionParser("2pi x").parse(), ("*", ("num", 2 * math.pi), ("x",)))
+
+    def test_errors(self):
+        for text in ("foo(x)", "sinx", "sin x", "1+", "(x", "x)", "", "2#x", "sin(x", "x + 1e400", "2e308x"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    compile_expression(text)
+
+    def test_kernels_agree(self):
+        func = compile_function("f(x) = tg(3x-156) + tg(x) - 4sin(x) + x^2")
+        x = np.linspace(-2, 2, 41)
+        expected = [math.tan(3*v-156) + math.tan(v) - 4*math.sin(v) + v*v for v in x.tolist()]
+        np.testing.assert_allclose(func.evaluate(x), expected)
+        self.assertEqual(str(func), "f(x) = tg(3x-156) + tg(x) - 4sin(x) + x^2")
+
+
+class AdaptiveTest(unittest.TestCase):
+    def test_poles_found_within_small_budget(self):
+        func = compile_function("tg(3x-156) + tg(x) - 4sin(x)")
+        poles = [(156 + math.pi / 2 + k * math.pi) / 3 for k in range(-60, -40)] \
+            + [math.pi / 2 + k * math.pi for k in range(-4, 3)]
+        poles = [pole for pole in poles if -10 <= pole <= 10]
+        self.assertEqual(len(poles), 25)
+        for budget in (200, 400, 2000, 5000):
+            x, y, gaps = func.sample_adaptive(-10, 10, budget)
+            self.assertEqual(len(gaps), len(x) - 1)
+            self.assertLessEqual(len(x), budget)
+            self.assertTrue(np.all(np.diff(x) >= 0))
+            spans = [(x[i], x[i + 1]) for i in np.flatnonzero(gaps)]
+            for x0, x1 in spans:
+                self.assertTrue(any(x0 <= pole <= x1 for pole in poles), (budget, x0, x1))
+            # 8 points per pole are too few to tell every pole from a root next to it
+            if budget >= 400:
+                self.assertEqual(len(spans), 25)
+
+    def test_budget(self):
+        func = compile_function("sin(x) + exp(x/9)")
+        evaluate = func.evaluate
+        count = [0]
+        def counted(x):
+            count[0] += len(x)
+            return evaluate(x)
+        func.evaluate = counted
+        for budget in (2, 10, 200, 500):
+            count[0] = 0
+            x, y, gaps = func.sample_adaptive(-10, 10, budget)
+            self.assertLessEqual(len(x), budget)
+            self.assertLess(count[0], budget + 10)
+        for budget in (2, 3, 10):
+            self.assertLessEqual(len(compile_function("tg(x)").sample_adaptive(-10, 10, budget)[0]), budget)
+
+    def test_no_poles(self):
+        for text in ("sin(x) + exp(x/9)", "x^2 - 4", "1/(x^2)"):
+            x, y, gaps = compile_function(text).sample_adaptive(-3, 3.1, 500)
+            self.assertFalse(gaps.any(), text)
+
+
+class PyramidTest(unittest.TestCase):
+    def test_query(self):
+        x = np.linspace(0, 1, 100001)
+        y = np.sin(x * 300)
+        y[50000] = 5
+        pyramid = MinMaxPyramid(x, y)
+        visible = pyramid.query(0.25, 0.75, 100)
+        self.assertLess(len(visible), 500)
+        self.assertTrue(np.all(np.diff(visible) > 0))
+        self.assertLessEqual(x[visible[0]], 0.25)
+        self.assertGreaterEqual(x[visible[-1]], 0.75)
+        self.assertIn(50000, visible)
+        # few points are drawn all, as the lowest levels are not kept
+        np.testing.assert_array_equal(pyramid.query(0.5, 0.50005, 1), np.arange(50000, 50006))
+
+    def test_built_once(self):
+        series = SeriesBuffer(np.arange(10.0), np.ones(10))
+        self.assertIs(series.build_pyramid(), series.build_pyramid())
+
+
+class ParallelTest(unittest.TestCase):
+    def test_accepts_compiled_functions_only(self):
+        self.assertTrue(ParallelEvaluator.accepts(compile_function("f(x) = sin(x) + exp(x/9)")))
+        # processes would compile its text into another function
+        self.assertFalse(ParallelEvaluator.accepts(Function(math.cos, "sin(x)", np.cos)))
+        self.assertFalse(ParallelEvaluator.accepts(Function(abs, "|x|")))
+        with self.assertRaises(ValueError):
+            ParallelEvaluator().apply(Function(math.cos, "sin(x)", np.cos), 0, 1, 10)
+
+
+class ClipTest(unittest.TestCase):
+    def clip(self, px, py, breaks=None):
+        return clip_polyline(np.array(px, dtype=float), np.array(py, dtype=float), 800, 600, breaks)
+
+    def test_inside(self):
+        self.assertEqual(self.clip([10, 20, 30], [10, 20, 15]), [[(10, 10), (20, 20), (30, 15)]])
+
+    def test_cut(self):
+        self.assertEqual(self.clip([10, 20, 30, 900], [10, 20, -5, 300]),
+            [[(10, 10), (20, 20), (28, 0)], [(44, 0), (800, 265)]])
+        self.assertEqual(self.clip([10, 20, 30], [10, 20, 15], np.array([True, False])), [[(20, 20), (30, 15)]])
+
+    def test_far_ends(self):
+        self.assertEqual(self.clip([50, 50], [-1e300, 1e300]), [[(50, 0), (50, 600)]])
+        self.assertEqual(self.clip([50, 50], [-1e308, 1e308]), [[(50, 0), (50, 600)]])
+        self.assertEqual(self.clip([0, 1e7], [0, 5e6]), [[(0, 0), (800, 400)]])
+        self.assertEqual(self.clip([100, 101], [300, 1e300]), [[(100, 300), (100, 600)]])
+        self.assertEqual(self.clip([50, 60, 70], [np.inf, 10, np.nan]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()